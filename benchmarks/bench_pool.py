@@ -0,0 +1,89 @@
+"""
+Clicks per second of the database work of an event button click (read the user's entry, write their status), with
+a new connection per statement like db.py used to open, and with the long-lived ConnectionPool.
+
+    python benchmarks/bench_pool.py [clicks]
+
+Runs in a temporary directory, on a fresh user database of USERS rows.
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import aiosqlite
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import reset_db
+from svsBot import db, globals
+from svsBot.connection_pool import ConnectionPool
+from svsBot.write_behind import WRITE_BEHIND_SQL
+
+USERS = 2000
+EVENT_ID = 1
+
+SELECT_ENTRY = f"SELECT {db.ENTRY_COLUMNS} FROM USERS WHERE DISCORD_ID = ?"
+# written one click at a time here, db.update_status() batches them
+UPDATE_STATUS = WRITE_BEHIND_SQL['ATTENDANCE']
+
+
+async def click_connect_per_statement(discord_id: int, status: str) -> None:
+    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+        async with conn.execute(SELECT_ENTRY, [discord_id]) as cursor:
+            await cursor.fetchone()
+    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+        await conn.execute(UPDATE_STATUS, [status, time.time(), EVENT_ID, discord_id])
+        await conn.commit()
+
+
+def pooled_click(pool: ConnectionPool):
+    async def click(discord_id: int, status: str) -> None:
+        async with pool.acquire() as conn:
+            async with conn.execute(SELECT_ENTRY, [discord_id]) as cursor:
+                await cursor.fetchone()
+        async with pool.acquire() as conn:
+            await conn.execute(UPDATE_STATUS, [status, time.time(), EVENT_ID, discord_id])
+            await conn.commit()
+    return click
+
+
+async def clicks_per_second(click, clicks: list[tuple[int, str]]) -> float:
+    start = time.perf_counter()
+    for discord_id, status in clicks:
+        await click(discord_id, status)
+    return len(clicks) / (time.perf_counter() - start)
+
+
+async def main(n: int) -> None:
+    await reset_db.reset_db()
+    ids = list(range(10 ** 17, 10 ** 17 + USERS))
+    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+        await conn.executemany("INSERT INTO USERS (DISCORD_ID, CLASS, LEVEL, UNIT, MARCH_SIZE, ALLIANCE, MM_TRAPS, "
+                               "SKINS, LOTTERY) VALUES (?, 'CE', 'ES', 'Army', '190-199', '508N', '', '', 1)",
+                               [(i,) for i in ids])
+        await conn.commit()
+
+    rnd = random.Random(0)
+    clicks = [(rnd.choice(ids), rnd.choice(['YES', 'MAYBE', 'NO'])) for _ in range(n)]
+
+    print(f'{n} clicks on {USERS} users:')
+    rate = await clicks_per_second(click_connect_per_statement, clicks)
+    print(f'  connection per statement  {rate:7.0f} clicks/s')
+
+    pool = ConnectionPool(globals.USER_DATABASE_NAME, size=globals.DB_POOL_SIZE)
+    await pool.open()
+    try:
+        rate = await clicks_per_second(pooled_click(pool), clicks)
+        print(f'  connection pool           {rate:7.0f} clicks/s')
+    finally:
+        await pool.close()
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
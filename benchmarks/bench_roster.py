@@ -0,0 +1,127 @@
+"""
+Time sequential event button clicks on a large roster. Each click moves a user to another status. The attendee
+fields are rendered after every click, or once for all of them and laid out over the pages like the render scheduler
+does it (minus the Discord call), since the scheduler coalesces the clicks between two edits.
+The baseline patches the embed fields in place by parsing their names, the way clicks worked before EventRoster.
+
+    python benchmarks/bench_roster.py [names] [clicks]
+"""
+import os
+import random
+import sys
+import time
+
+import discord
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from svsBot.event_layout import layout_pages
+from svsBot.event_roster import EventRoster, fieldPrefix, FIELD_VALUE_SOFT_LIMIT
+from svsBot.render_scheduler import snapshot
+
+STATUSES = EventRoster.STATUSES
+
+
+def field_status_ranges(embed: discord.Embed) -> dict[str, tuple[int, int]]:
+    """
+    {status: (index of its title field, index after its last field)}
+    """
+    starts = [(i, field.name.split()[0]) for i, field in enumerate(embed.fields) if field.name != '\u200b']
+    ends = [i for i, _ in starts[1:]] + [len(embed.fields)]
+    return {status: (start, end) for (start, status), end in zip(starts, ends)}
+
+
+def edit_fields_by_parsing(embed: discord.Embed, name: str, status: str, operation: str) -> None:
+    """
+    Add or remove a name by parsing the status' field values and rebuilding them, like the old edit_field_values()
+    """
+    start, end = field_status_ranges(embed)[status]
+    names = []
+    for field in embed.fields[start:end]:
+        names.extend(field.value[len(fieldPrefix):].split('\n')[:-1])
+    if operation == 'remove':
+        names.remove(name)
+    else:
+        names.append(name)
+
+    count = len(names)
+    fieldVals = []
+    fieldVal = fieldPrefix
+    while names:
+        fieldVal += names.pop(0) + '\n'
+        if len(fieldVal) > FIELD_VALUE_SOFT_LIMIT:
+            fieldVals.append(fieldVal)
+            fieldVal = fieldPrefix
+    if fieldVal != fieldPrefix or not fieldVals:
+        fieldVals.append(fieldVal)
+    # a status keeps its fields when it needs fewer, the last ones stay empty
+    fieldVals.extend([fieldPrefix] * (end - start - len(fieldVals)))
+
+    for i in range(start, end):
+        embed.set_field_at(i, name=f'{status}  [{count}]' if i == start else '\u200b', value=fieldVals.pop(0))
+    if fieldVals:
+        embed.insert_field_at(end, name='\u200b', value=fieldVals.pop())
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    clicks = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    rnd = random.Random(5)
+    names = [f'user{i:07d}' for i in range(n)]
+    initial = [rnd.choice(STATUSES) for _ in range(n)]
+    # only clicks that change the user's status, the others don't touch the embed
+    current = list(initial)
+    moves = []
+    while len(moves) < clicks:
+        i, status = rnd.randrange(n), rnd.choice(STATUSES)
+        if current[i] != status:
+            moves.append((i, current[i], status))
+            current[i] = status
+
+    embed = discord.Embed(title='Event')
+    for status in STATUSES:
+        embed.add_field(name=f'{status}  [0]', value=fieldPrefix)
+    for i, status in enumerate(initial):
+        edit_fields_by_parsing(embed, names[i], status, 'add')
+    start = time.perf_counter()
+    for i, old, new in moves:
+        edit_fields_by_parsing(embed, names[i], old, 'remove')
+        edit_fields_by_parsing(embed, names[i], new, 'add')
+    parsing = time.perf_counter() - start
+
+    roster = EventRoster()
+    for i, status in enumerate(initial):
+        roster.set(i, names[i], status)
+    rosterEmbed = discord.Embed(title='Event')
+    start = time.perf_counter()
+    for i, old, new in moves:
+        roster.set(i, names[i], new)
+        roster.render_fields()
+    rendering = time.perf_counter() - start
+
+    # the render scheduler coalesces the clicks between two edits, here all of them
+    for i, old, new in moves:
+        roster.set(i, names[i], old)
+    roster.render_fields()
+    start = time.perf_counter()
+    for i, old, new in moves:
+        roster.set(i, names[i], new)
+    for page in layout_pages(rosterEmbed, roster.render_fields()):
+        snapshot(page)
+    coalesced = time.perf_counter() - start
+
+    # both show the same attendees in the same order
+    assert [roster.names(status) for status in STATUSES] == \
+           [[name for field in embed.fields[start:end] for name in field.value[len(fieldPrefix):].split('\n')[:-1]]
+            for start, end in (field_status_ranges(embed)[status] for status in STATUSES)]
+
+    print(f'{clicks} clicks on {n} names:')
+    print(f'  field parsing            {parsing * 1000:7.1f} ms ({parsing / clicks * 1e6:4.0f} us/click)')
+    print(f'  roster, render each      {rendering * 1000:7.1f} ms ({rendering / clicks * 1e6:4.0f} us/click)')
+    print(f'  roster, render once      {coalesced * 1000:7.1f} ms ({coalesced / clicks * 1e6:4.0f} us/click)')
+
+
+if __name__ == '__main__':
+    main()
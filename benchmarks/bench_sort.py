@@ -0,0 +1,108 @@
+"""
+Time the sorting of the CSV report (helpers.get_sorted_entries) and the whole CSV rendering (helpers.write_csv)
+for a large roster, against sorting each bucket by one column at a time. The sort rank of the rows, which the
+report query computes, is computed up front.
+
+    python benchmarks/bench_sort.py [rows]
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from svsBot import db, helpers, profession_config
+
+REPEAT = 20
+
+
+def make_partitions(config: profession_config.ProfessionConfig, rows: int) -> dict:
+    """
+    Report entries (see db.get_report_entries) of a random roster, partitioned by db.partition_by_status_and_class()
+    """
+    rnd = random.Random(1)
+    categories = config.categories
+    entries = []
+    for i in range(rows):
+        class_ = rnd.choice(['CE', 'MM'])
+        level = rnd.choice(config.category('level', class_).options)
+        units = rnd.sample(categories['units'].options, rnd.randint(1, 3))
+        units = ', '.join(sorted(units, key=categories['units'].options.index))
+        march_size = rnd.choice(categories['march_size'].options)
+        alliance = rnd.choice(categories['alliance'].options)
+        traps = ', '.join(rnd.sample(categories['mm_traps'].options[1:], 2)) if class_ == 'MM' else ''
+        skins = ', '.join(rnd.sample(categories['skins'].options[1:], 1)) if rnd.random() < .5 else ''
+        status = rnd.choice(['YES', 'MAYBE', 'NO'])
+        entries.append((f'user{i}', class_, level, units, march_size, alliance, traps, skins, status, 0, 1,
+                        *config.encode_profession(class_, level, units, march_size, traps, skins)))
+
+    # the sort rank the report query computes in SQL
+    alliances = config.category('alliance')
+    order = sorted(range(rows), key=lambda i: (-entries[i][db.LEVEL_RANK_IND], -entries[i][db.MARCH_RANK_IND],
+                                               helpers.ascending_rank(alliances, entries[i][db.ALLIANCE_IND]), i))
+    ranks = {i: rank for rank, i in enumerate(order, 1)}
+    entries = [(*entry, ranks[i]) for i, entry in enumerate(entries)]
+    return db.partition_by_status_and_class(entries)
+
+
+def sort_column_by_column(partitions: dict, status: str) -> tuple[list, list, list]:
+    """
+    What get_sorted_entries() returns, with each bucket sorted once per column (stable sorts, last key first)
+    """
+    units = profession_config.get().category('units')
+    single = [1 << units.rank(unit) for unit in ['Army', 'Air Force', 'Navy']]
+
+    multiUnitArrays, unitArrays = [], []
+    for class_ in ['CE', 'MM']:
+        entries = partitions[status][class_]
+        multiUnitArrays.append([x for x in entries if x[db.UNIT_MASK_IND] & (x[db.UNIT_MASK_IND] - 1)])
+        unitArrays.extend([x for x in entries if x[db.UNIT_MASK_IND] == mask] for mask in single)
+
+    def sort_levels(bucket):
+        bucket = helpers.sort_by_profession_category(bucket, 'alliance')
+        bucket = sorted(bucket, key=lambda x: x[db.MARCH_RANK_IND], reverse=True)
+        return sorted(bucket, key=lambda x: x[db.LEVEL_RANK_IND], reverse=True)
+
+    multiUnitArrays = [sorted(sort_levels(bucket), key=lambda x: bin(x[db.UNIT_MASK_IND]).count('1'), reverse=True)
+                       for bucket in multiUnitArrays]
+    unitArrays = [sort_levels(bucket) for bucket in unitArrays]
+
+    sorted_maybe = []
+    if status == 'YES':
+        sorted_maybe = [sorted(partitions['MAYBE'][class_], key=lambda x: x[db.LEVEL_RANK_IND], reverse=True)
+                        for class_ in ['CE', 'MM']]
+        sorted_maybe = helpers.sort_by_profession_category(sorted_maybe[0] + sorted_maybe[1], 'alliance')
+
+    def parse(bucket):
+        return [helpers.parse_entry(x, x[db.CLASS_IND]) for x in bucket]
+
+    return [parse(b) for b in multiUnitArrays], [parse(b) for b in unitArrays], parse(sorted_maybe)
+
+
+def best_of(fn, *args) -> float:
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    config = profession_config.load(os.path.join(ROOT, 'profession_info.json'))
+    partitions = make_partitions(config, rows)
+    entries = partitions['ALL']['CE'] + partitions['ALL']['MM']
+
+    print(f'{rows} rows, best of {REPEAT}:')
+    for status in ['YES', 'ALL']:
+        assert sort_column_by_column(partitions, status) == helpers.get_sorted_entries(partitions, status)
+        print(f'  {status:3}  sort per column     {best_of(sort_column_by_column, partitions, status) * 1000:8.2f} ms')
+        print(f'  {status:3}  get_sorted_entries  {best_of(helpers.get_sorted_entries, partitions, status) * 1000:8.2f} ms')
+        print(f'  {status:3}  write_csv           {best_of(helpers.write_csv, entries, status, False) * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
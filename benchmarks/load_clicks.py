@@ -0,0 +1,134 @@
+"""
+Load test of the event buttons: n users click concurrently, each a few times in a row, against a real user database.
+Every Discord call (acknowledging the click, the ephemeral followup, DMs, message edits) is faked to take LATENCY
+seconds. Prints clicks/s and acknowledgement latency for each n, then checks that every user's roster status
+matches the database and that no user locks are left.
+
+    python benchmarks/load_clicks.py [latency in seconds]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import aiosqlite
+import discord
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import reset_db
+from svsBot import db, dm_queue, globals, profession_config
+from svsBot.event_interaction import EventButtonsView, user_locks
+from svsBot.event_registry import Event, events
+
+LATENCY = 0.03
+USERS = 200
+# (concurrent users, clicks per user)
+RUNS = [(1, 40), (10, 8), (50, 8), (200, 8)]
+STATUSES = ['YES', 'MAYBE', 'NO']
+
+# seconds from each click to its acknowledgement
+acks = []
+
+
+class Channel:
+    id = 1
+
+    async def send(self, **kwargs):
+        await asyncio.sleep(LATENCY)
+        return Message(random.getrandbits(60))
+
+
+class Message:
+    channel = Channel()
+    jump_url = ''
+
+    def __init__(self, id_):
+        self.id = id_
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(LATENCY)
+
+
+class User:
+    dm_channel = None
+
+    def __init__(self, id_):
+        self.id = id_
+        self.display_name = f'user{id_ % 10 ** 6:06d}'
+
+    async def send(self, **kwargs):
+        await asyncio.sleep(LATENCY)
+
+
+class Response:
+    def __init__(self):
+        self.start = time.perf_counter()
+
+    async def defer(self, **kwargs):
+        await asyncio.sleep(LATENCY)
+        acks.append(time.perf_counter() - self.start)
+
+
+class Followup:
+    async def send(self, *args, **kwargs):
+        await asyncio.sleep(LATENCY)
+
+
+class Interaction:
+    def __init__(self, user):
+        self.user = user
+        self.response = Response()
+        self.followup = Followup()
+        self.created_at = discord.utils.utcnow()
+
+
+async def main() -> None:
+    profession_config.load(os.path.join(ROOT, globals.PROFESSION_INFO_JSON))
+    await reset_db.reset_db()
+    ids = list(range(10 ** 17, 10 ** 17 + USERS))
+    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+        await conn.executemany("INSERT INTO USERS (DISCORD_ID, CLASS, LEVEL, UNIT, MARCH_SIZE, ALLIANCE, MM_TRAPS, "
+                               "SKINS, LOTTERY) VALUES (?, 'CE', 'ES', 'Army', '190-199', '508N', '', '', 1)",
+                               [(i,) for i in ids])
+        await conn.commit()
+    await db.open_connections()
+
+    event = Event(Message(1), 'Load test', f'<t:{int(time.time()) + 24 * 60 * 60}>')
+    event.view = EventButtonsView(event, discord.Embed(title=event.title))
+    events.add(event)
+
+    rnd = random.Random(0)
+    users = [User(i) for i in ids]
+    for n, clicks in RUNS:
+        async def click(user):
+            for _ in range(clicks):
+                await event.view.process_click(Interaction(user), rnd.choice(STATUSES))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(click(user) for user in users[:n]))
+        elapsed = time.perf_counter() - start
+
+        acks.sort()
+        print(f'{n:4d} concurrent users: {n * clicks / elapsed:6.0f} clicks/s, ack p50 '
+              f'{acks[len(acks) // 2] * 1000:3.0f} ms, p99 {acks[int(len(acks) * .99)] * 1000:3.0f} ms')
+        acks.clear()
+
+    stored = dict(await db.get_event_statuses(event.id))
+    mismatches = [user.id for user in users if stored.get(user.id) != event.view.roster.status(user.id)]
+    print(f'roster/database mismatches: {len(mismatches)}, user locks left: {len(user_locks)}')
+
+    event.cancel_tasks()
+    await dm_queue.close()
+    await db.close_connections()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        LATENCY = float(sys.argv[1])
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        asyncio.run(main())
@@ -51,7 +51,8 @@ def setup_bot():
         'intents': discord.Intents(messages=True, members=True, guilds=True, message_content=True),
         'description': 'Manages event attendance and user history',
         'allowed_mentions': discord.AllowedMentions(everyone=False, roles=False),
-        'activity': discord.Game(name=f'{globals.COMMAND_PREFIX}help')
+        'activity': discord.Game(name=f'{globals.COMMAND_PREFIX}help'),
+        'chunk_guilds_at_startup': globals.CHUNK_GUILDS_AT_STARTUP
     }
 
     # initialize bot
@@ -1,14 +1,38 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+import asyncio
+import json
 import sys
+import time
+from typing import Awaitable, Optional
 
 import logging
 
 import svsBot.my_commands as my_commands
 import svsBot.my_help as my_help
 import svsBot.db as db
+import svsBot.dm_queue as dm_queue
 import svsBot.error_handler as error_handler
+import svsBot.event_registry as event_registry
 import svsBot.globals as globals
+import svsBot.helpers as helpers
+import svsBot.job_scheduler as job_scheduler
+import svsBot.profession_config as profession_config
+from svsBot.event_interaction import EventButtonsView, load_roster
+from svsBot.render_scheduler import snapshot
+
+
+async def timed(timings: dict, phase: str, coro: Awaitable) -> None:
+    """
+    Await coro, recording how long it took (seconds) in timings[phase]
+    """
+    start = time.perf_counter()
+    await coro
+    timings[phase] = time.perf_counter() - start
+
+
+def format_timings(timings: dict) -> str:
+    return ', '.join(f'{phase} {seconds * 1000:.0f} ms' for phase, seconds in timings.items())
 
 
 class Bot(commands.Bot):
@@ -23,21 +47,92 @@ class Bot(commands.Bot):
         # list of channels to listen on for event commands
         self.main_channels = []
 
-        # background loop that sends a reminder to people signed up as "maybe"
-        self.maybe_loop = None
-
         # bug report channel that receives reports from $bug cmd
         self.bug_report_channel = None
 
+        # on_ready runs again after every reconnect, but the bot is only initialized the first time
+        self.connected = False
+
+        # set once initialize() is done, event commands are rejected until then
+        self.initialized = False
+
+        # False while the encoded profession columns don't match the reloaded profession config, see
+        # watch_profession_config. db.open_connections() encodes them at startup
+        self.professions_encoded = True
+
     async def setup_hook(self) -> None:
-        # add cogs
+        # runs once, before connecting to Discord
+        timings = {}
+        start = time.perf_counter()
+
+        # compile profession_info.json once; everything else reads the compiled config
+        profession_config.load()
+        timings['config'] = time.perf_counter() - start
+
+        # open the long-lived database connections before anything can touch the database
+        await timed(timings, 'database', db.open_connections())
+        await timed(timings, 'cogs', self.add_cogs())
+
+        if globals.PROFESSION_CONFIG_POLL_SECONDS > 0:
+            self.watch_profession_config.change_interval(seconds=globals.PROFESSION_CONFIG_POLL_SECONDS)
+            self.watch_profession_config.start()
+
+        job_scheduler.jobs.register(helpers.REMINDER, helpers.send_reminders)
+
+        timings['total'] = time.perf_counter() - start
+        logging.info(f'Setup: {format_timings(timings)}')
+
+    async def add_cogs(self) -> None:
         await self.add_cog(my_commands.DM(self))
         await self.add_cog(my_commands.Event(self))
         await self.add_cog(my_commands.Misc(self))
         # await self.add_cog(my_help.Help(self))
         await self.add_cog(error_handler.CommandErrorHandler(self))
 
-    async def load_variables(self) -> None:
+    async def close(self) -> None:
+        self.watch_profession_config.cancel()
+        await job_scheduler.jobs.stop()
+        # deliver what is queued while still connected
+        await dm_queue.close()
+        await super().close()
+        await db.close_connections()
+
+    @tasks.loop(seconds=30)
+    async def watch_profession_config(self) -> None:
+        # pick up edits to profession_info.json without restarting (and reconnecting) the bot
+        if profession_config.reload_if_changed():
+            # options may have been added, removed or reordered
+            self.professions_encoded = False
+
+        if not self.professions_encoded:
+            # an exception would stop the loop for good, so log it and try again on the next poll
+            try:
+                await db.reencode_professions()
+                self.professions_encoded = True
+            except Exception:
+                logging.exception('Failed to re-encode the professions for the reloaded profession config.')
+
+    async def initialize(self) -> None:
+        """
+        One-time initialization once the guild, channel and member caches are filled: channels, then events and jobs.
+        Logs how long each phase took.
+        """
+        timings = {}
+        start = time.perf_counter()
+
+        # one after the other, so each timing is the phase's own and a missing channel exits before any event is loaded
+        await timed(timings, 'channels', self.load_channels())
+        await timed(timings, 'events', self.load_events())
+
+        # run the reminders etc. of the loaded events, including the ones that came due while the bot was down
+        await timed(timings, 'jobs', job_scheduler.jobs.start())
+
+        self.initialized = True
+        timings['total'] = time.perf_counter() - start
+        logging.info(f'Startup: {format_timings(timings)} ({len(event_registry.events)} event(s), '
+                     f'{len(job_scheduler.jobs)} pending job(s))')
+
+    async def load_channels(self) -> None:
         # guild-related instance variables
 
         # guilds
@@ -64,40 +159,78 @@ class Bot(commands.Bot):
             self.remove_command('bug')
             logging.error(error)
 
-        # event variables
-        # if bot is restarted while the event is active, repopulate everything in memory to ensure seamless restart
-        eventTitle, eventTime, eventMessageID, eventChannelID = await db.get_event()
-        if eventMessageID:
-            import time
-            from svsBot.event_interaction import EventButtonsView
-            import svsBot.helpers as helpers
+    async def load_events(self) -> None:
+        # if bot is restarted while events are active, repopulate everything in memory to ensure seamless restart.
+        # One event failing to load must not keep the others (and the jobs) from loading
+        rows = await db.get_events()
+        results = await asyncio.gather(*(self.load_event(*row) for row in rows), return_exceptions=True)
+        for (event_id, _, title, _, _), result in zip(rows, results):
+            if isinstance(result, Exception):
+                logging.error(f'Failed to load event "{title}" ({event_id}).', exc_info=result)
 
-            # event variables
-            globals.eventInfo = eventTitle + ' @ ' + eventTime
-            globals.eventChannel = self.get_channel(eventChannelID)
-            globals.eventMessage = await globals.eventChannel.fetch_message(eventMessageID)
+    async def load_event(self, event_id: int, channel_id: int, title: str, event_time: str,
+                         shown: Optional[str]) -> None:
+        channel = self.get_channel(channel_id)
+        if channel is None:
+            logging.error(f'Failed to acquire the channel of event "{title}", it is not loaded.')
+            return
 
-            # re-initializes EventButtonsView instance so that buttons still work
-            view = EventButtonsView(globals.eventMessage)
-            await globals.eventMessage.edit(view=view)
+        # continuation messages holding the names that did not fit in the event embed
+        pages = await db.get_event_pages(event_id)
 
-            # TODO: test this
-            # restart confirm_maybe loop
-            # extract unix time of event, convert to time until event, send to fxn
-            eventTime = int(eventTime.strip('><t:'))
-            timeUntilEvent = eventTime - time.time()
-            # confirmMaybeTime = eventTime - globals.CONFIRM_MAYBE_WARNING_HOURS * 60 * 60
-            # timeUntilConfirmMaybe = confirmMaybeTime - time.time()
+        if shown is not None:
+            # the database knows what the messages show, so they don't have to be fetched
+            message = channel.get_partial_message(event_id)
+            embed = discord.Embed.from_dict(json.loads(shown))
+            pageMessages = [channel.get_partial_message(pageID) for pageID, _ in pages]
+            shownList = [shown] + [pageShown for _, pageShown in pages]
+
+        else:
+            # stored before the rendered embeds were, fetch the messages this once
+            try:
+                message = await channel.fetch_message(event_id)
+            except discord.NotFound:
+                # nothing left to sign up on
+                logging.error(f'Event message of "{title}" was deleted, removing the event.')
+                await db.close_event(event_id, 'CANCELLED')
+                await job_scheduler.jobs.cancel_event(event_id)
+                return
+            embed = message.embeds[0]
+
+            pageMessages = []
+            for pageID, _ in pages:
+                try:
+                    pageMessages.append(await channel.fetch_message(pageID))
+                except discord.NotFound:
+                    logging.error(f'Continuation message {pageID} of event "{title}" was deleted.')
+            shownList = [snapshot(embed)] + [snapshot(page.embeds[0]) if page.embeds else None
+                                             for page in pageMessages]
+            await db.save_event_render(event_id, shownList[0],
+                                       [(page.id, pageShown) for page, pageShown in zip(pageMessages, shownList[1:])])
+
+        event = event_registry.Event(message, title, event_time)
 
-            maybe_loop = await helpers.start_confirm_maybe_loop(timeUntilEvent, globals.eventMessage.guild)
-            # maybe_loop = await helpers.start_confirm_maybe_loop(timeUntilConfirmMaybe, self.eventMessage.guild)
-            self.maybe_loop = maybe_loop
+        # re-initializes EventButtonsView instance so that buttons still work, with the attendees from the database.
+        # The message already shows the buttons (same custom_ids), so registering the view routes their clicks to it
+        # without editing the message
+        roster = await load_roster(event)
+        event.view = EventButtonsView(event, embed, pageMessages, roster, shownList)
+        self.add_view(event.view, message_id=event_id)
+        event_registry.events.add(event)
+        # bring the embed in line with the database, e.g. clicks made just before the restart. Only edits the
+        # messages whose names differ
+        event.view.renderer.mark_dirty()
 
     async def on_ready(self):
+        if self.connected:
+            logging.info(f'{self.user.name} reconnected.')
+            return
+        self.connected = True
+
         logging.info(f'{self.user.name} connected!')
         logging.info(f'discord.py version = {discord.__version__}' + '\n')
 
-        await self.load_variables()
+        await self.initialize()
 
         for guild in self.guilds:
             logging.info('Connected to guild: ' + guild.name)
@@ -116,19 +249,10 @@ class Bot(commands.Bot):
         if self.bug_report_channel:
             logging.info('Sending bugs to channel: ' + self.bug_report_channel.guild.name + '/' + self.bug_report_channel.name)
 
-        if globals.eventMessage:
+        for event in event_registry.events:
             logging.info(f'Reacquired existing event in channel: '
-                  f'{globals.eventChannel.guild.name}/{globals.eventChannel.name}')
+                  f'{event.channel.guild.name}/{event.channel.name}')
 
         m = f'Setup complete, {self.user.name} online.'
         print(m)
         logging.info(m)
-
-    def reset_event_vars(self) -> None:
-        globals.eventInfo = ''
-        globals.eventMessage = None
-        globals.eventChannel = None
-
-        if self.maybe_loop is not None:
-            self.maybe_loop.cancel()
-            self.maybe_loop = None
@@ -2,46 +2,28 @@ import aiosqlite
 import os
 import asyncio
 
+from svsBot import migrations
+
 
 async def reset_db():
 
     # User database
-    if os.path.exists("userHistory.db"):
-        os.remove("userHistory.db")
+    # the bot runs in WAL mode, so also remove the write-ahead log and shared-memory files
+    for filename in ["userHistory.db", "userHistory.db-wal", "userHistory.db-shm"]:
+        if os.path.exists(filename):
+            os.remove(filename)
 
+    # the schema is created by the same migrations the bot runs at startup
     async with aiosqlite.connect('userHistory.db') as conn:
-        async with conn.cursor() as cursor:
-            await cursor.execute("""CREATE TABLE USERS (
-                    discord_ID INTEGER NOT NULL PRIMARY KEY,
-                    class TEXT,
-                    level INTEGER,
-                    unit TEXT,
-                    march_size TEXT,
-                    alliance TEXT,
-                    mm_traps TEXT,
-                    skins TEXT,
-                    status TEXT,
-                    lottery INTEGER,
-                    interacted_with_event INTEGER
-                    );
-                """)
-            await conn.commit()
+        await migrations.migrate(conn, migrations.USER_MIGRATIONS, 'userHistory.db')
 
     # Event database
-    if os.path.exists("eventInfo.db"):
-        os.remove("eventInfo.db")
+    for filename in ["eventInfo.db", "eventInfo.db-wal", "eventInfo.db-shm"]:
+        if os.path.exists(filename):
+            os.remove(filename)
 
     async with aiosqlite.connect('eventInfo.db') as conn:
-        async with conn.cursor() as cursor:
-            await cursor.execute("""CREATE TABLE EVENT (
-                    title TEXT,
-                    time TEXT,
-                    message_ID INT,
-                    channel_ID INT
-                    );
-                """)
-            await cursor.execute("INSERT INTO EVENT (title, time, message_ID, channel_ID) values ('placeholder', 'placeholder', 0, 0)")
-            await conn.commit()
+        await migrations.migrate(conn, migrations.EVENT_MIGRATIONS, 'eventInfo.db')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+import aiosqlite
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import logging
+
+from . import globals
+
+# applied to every pooled connection when it is opened
+# WAL lets the CSV/dump readers run while a click is writing, and synchronous=NORMAL is safe in WAL mode
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    f'PRAGMA cache_size = -{globals.DB_CACHE_SIZE_KB}',
+    f'PRAGMA mmap_size = {globals.DB_MMAP_SIZE_BYTES}',
+    'PRAGMA temp_store = MEMORY',
+)
+
+
+class ConnectionPool:
+    """
+    Small pool of long-lived aiosqlite connections to one database file.
+
+    The bot opens the pools once in setup_hook and closes them on shutdown. If a pool is used before it was opened
+    (e.g. from a standalone script), it opens itself on first use.
+    """
+
+    __slots__ = ('database', 'size', '_connections', '_idle', '_open_lock')
+
+    def __init__(self, database: str, size: int = 1):
+        self.database = database
+        self.size = size
+        self._connections = []
+
+        # asyncio primitives are created inside the running loop, see open()
+        self._idle = None
+        self._open_lock = None
+
+    @property
+    def is_open(self) -> bool:
+        return bool(self._connections)
+
+    async def open(self) -> None:
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+
+        async with self._open_lock:
+            if self.is_open:
+                return
+
+            idle = asyncio.Queue()
+            connections = []
+            for _ in range(self.size):
+                # sqlite3 keeps an LRU of prepared statements per connection, so the fixed SQL strings in db.py
+                # are only compiled once for the lifetime of the bot
+                conn = await aiosqlite.connect(self.database, cached_statements=globals.DB_CACHED_STATEMENTS)
+                for pragma in PRAGMAS:
+                    await conn.execute(pragma)
+                connections.append(conn)
+                idle.put_nowait(conn)
+
+            self._idle = idle
+            self._connections = connections
+            logging.info(f'Opened {self.size} connection(s) to {self.database}')
+
+    async def close(self) -> None:
+        connections, self._connections = self._connections, []
+        for conn in connections:
+            await conn.close()
+        self._idle = None
+
+        if connections:
+            logging.info(f'Closed {len(connections)} connection(s) to {self.database}')
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Borrow a connection from the pool, waiting for one to be returned if they are all in use.
+        """
+        if not self.is_open:
+            await self.open()
+
+        idle = self._idle
+        conn = await idle.get()
+        try:
+            yield conn
+        finally:
+            # never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                await conn.rollback()
+            idle.put_nowait(conn)
@@ -1,14 +1,98 @@
 import discord
 from typing import Union, Optional
 import aiosqlite
+import time
 
 import logging
-from json import load
 
-from . import globals
+from . import globals, migrations, profession_config, member_cache
+from . event_registry import events
+from . connection_pool import ConnectionPool
+from . write_behind import WriteBehindQueue
+from . entry_cache import EntryCache
 
 # I wish python supported enums...
 ID_IND, CLASS_IND, LEVEL_IND, UNITS_IND, MARCH_IND, ALLIANCE_IND, MMTRAPS_IND, SKINS_IND, STATUS_IND, LOTTERY_IND, INTERACTED_IND = range(11)
+# rows from get_report_entries() also carry the encoded profession columns (see ProfessionConfig.encode_profession)
+LEVEL_RANK_IND, MARCH_RANK_IND, UNIT_MASK_IND, TRAPS_MASK_IND, SKINS_MASK_IND = range(11, 16)
+# ... and their position in the sorted sections of the CSV report, see get_report_entries()
+SORT_RANK_IND = 16
+
+# STATUS and INTERACTED_WITH_EVENT of USERS are from before events had their own attendance (ATTENDANCE table) and
+# are no longer written. Each event's statuses are in its roster (Event.status()) and in ATTENDANCE
+ENTRY_COLUMNS = "DISCORD_ID, CLASS, LEVEL, UNIT, MARCH_SIZE, ALLIANCE, MM_TRAPS, SKINS, STATUS, LOTTERY, " \
+                "INTERACTED_WITH_EVENT"
+ENCODED_COLUMNS = "LEVEL_RANK, MARCH_RANK, UNIT_MASK, TRAPS_MASK, SKINS_MASK"
+# the same layout, with the status and interaction flag of one event. Used with USERS_ATTENDANCE / EVENT_ATTENDEES
+EVENT_ENTRY_COLUMNS = "U.DISCORD_ID, U.CLASS, U.LEVEL, U.UNIT, U.MARCH_SIZE, U.ALLIANCE, U.MM_TRAPS, U.SKINS, " \
+                      "COALESCE(A.STATUS, 'NO'), U.LOTTERY, A.DISCORD_ID IS NOT NULL"
+EVENT_ENCODED_COLUMNS = "U.LEVEL_RANK, U.MARCH_RANK, U.UNIT_MASK, U.TRAPS_MASK, U.SKINS_MASK"
+# every user, with their attendance of the event bound to the parameter (no match for None). Reads all of USERS,
+# so only use it when users that did not sign up ("NO") are wanted
+USERS_ATTENDANCE = "USERS U LEFT JOIN ATTENDANCE A ON A.DISCORD_ID = U.DISCORD_ID AND A.EVENT_ID = ?"
+# the users that signed up for the event bound to the parameter. Only reads that event's ATTENDANCE rows
+EVENT_ATTENDEES = "ATTENDANCE A JOIN USERS U ON U.DISCORD_ID = A.DISCORD_ID AND A.EVENT_ID = ?"
+
+# recipients of each reminder audience, see get_audience_ids(). The ATTENDANCE ones read only the event's rows with
+# that status (ATTENDANCE_STATUS index); 'NOT_INTERACTED' walks USERS, probing ATTENDANCE by primary key
+AUDIENCE_SQL = {
+    'MAYBE': "SELECT DISCORD_ID FROM ATTENDANCE WHERE EVENT_ID = :event AND STATUS = 'MAYBE' "
+             "AND DISCORD_ID > :after ORDER BY DISCORD_ID",
+    'UNCONFIRMED': "SELECT DISCORD_ID FROM ATTENDANCE WHERE EVENT_ID = :event AND STATUS = 'YES' AND NOT CONFIRMED "
+                   "AND DISCORD_ID > :after ORDER BY DISCORD_ID",
+    'NOT_INTERACTED': "SELECT DISCORD_ID FROM USERS U WHERE DISCORD_ID > :after AND NOT EXISTS "
+                      "(SELECT 1 FROM ATTENDANCE A WHERE A.EVENT_ID = :event AND A.DISCORD_ID = U.DISCORD_ID) "
+                      "ORDER BY DISCORD_ID",
+}
+
+# long-lived connections, opened by Bot.setup_hook() and closed by Bot.close()
+user_db = ConnectionPool(globals.USER_DATABASE_NAME, size=globals.DB_POOL_SIZE)
+event_db = ConnectionPool(globals.EVENT_DATABASE_NAME, size=1)
+
+# per-click ATTENDANCE writes are batched instead of committed one at a time
+user_writes = WriteBehindQueue(user_db, interval=globals.WRITE_BEHIND_INTERVAL_SECONDS,
+                               max_pending=globals.WRITE_BEHIND_MAX_PENDING)
+
+# recently used USERS rows, so that repeat clicks don't have to query the database
+entry_cache = EntryCache(max_size=globals.ENTRY_CACHE_SIZE)
+
+
+async def open_connections() -> None:
+    await migrate_databases()
+    await user_db.open()
+    await event_db.open()
+    await reencode_professions()
+    await adopt_legacy_attendance()
+
+
+async def migrate_databases() -> None:
+    """
+    Upgrade both databases to the latest schema version in place.
+    Runs on its own connections, before the pools are opened, so no pooled connection holds the old schema.
+    """
+    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+        await migrations.migrate(conn, migrations.USER_MIGRATIONS, globals.USER_DATABASE_NAME)
+    async with aiosqlite.connect(globals.EVENT_DATABASE_NAME) as conn:
+        await migrations.migrate(conn, migrations.EVENT_MIGRATIONS, globals.EVENT_DATABASE_NAME)
+
+
+async def close_connections() -> None:
+    await user_writes.close()
+    await user_db.close()
+    await event_db.close()
+
+
+async def checkpoint() -> None:
+    """
+    Copy the write-ahead log back into the main database file, so that the .db file alone is a complete backup
+    """
+    await user_writes.flush()
+    async with user_db.acquire() as conn:
+        await conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+async def flush_pending_writes() -> None:
+    await user_writes.flush()
 
 
 async def add_entry(values: Union[list, tuple]) -> None:
@@ -21,61 +105,215 @@ async def add_entry(values: Union[list, tuple]) -> None:
     interacted_with_event defaults to 0
     Profession must be provided by User via calls of ProfessionMenuView()
     """
-    sql = "INSERT INTO USERS (discord_ID, class, level, unit, march_size, alliance, mm_traps, skins, status, lottery, interacted_with_event) "\
-          "values(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
-    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+    sql = f"INSERT INTO USERS ({ENTRY_COLUMNS}, {ENCODED_COLUMNS}) "\
+          "values(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    encoded = encode_profession(values[CLASS_IND:SKINS_IND + 1])
+    # clicks from before the user was registered never applied to the database, so don't let them apply now
+    user_writes.discard(values[ID_IND])
+    async with user_db.acquire() as conn:
         async with conn.cursor() as cursor:
-            await cursor.execute(sql, values)
+            await cursor.execute(sql, [*values, *encoded])
             await conn.commit()
 
+    entry_cache.put(values[ID_IND], values)
+
 
 async def get_entry(discord_id: int) -> Optional[tuple]:
     """
     Returns entry (list) associated with unique discord ID. If no entry exists, returns None
     """
-    sql = "SELECT * FROM USERS WHERE DISCORD_ID = ?"
+    entry = entry_cache.get(discord_id)
+    if entry is not None:
+        return entry
+
+    sql = f"SELECT {ENTRY_COLUMNS} FROM USERS WHERE DISCORD_ID = ?"
     val = [discord_id]
-    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
-        async with conn.cursor() as cursor:
-            await cursor.execute(sql, val)
-            entry = await cursor.fetchone()
+    entry_cache.begin_fill(discord_id)
+    try:
+        async with user_db.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(sql, val)
+                entry = await cursor.fetchone()
+    except BaseException:
+        entry_cache.end_fill(discord_id, None)
+        raise
 
     if not entry:
+        entry_cache.end_fill(discord_id, None)
         return None
-    else:
-        return entry
 
+    entry_cache.end_fill(discord_id, entry)
+    return entry
 
-async def update_event(title: str, time: str, message_id: discord.Message.id, channel_id: discord.TextChannel.id) -> None:
-    sql = "UPDATE EVENT SET TITLE = ?, TIME = ?, MESSAGE_ID = ?, CHANNEL_ID = ?"
-    values = [title, time, message_id, channel_id]
-    async with aiosqlite.connect(globals.EVENT_DATABASE_NAME) as conn:
-        async with conn.cursor() as cursor:
-            await cursor.execute(sql, values)
-            await conn.commit()
 
+async def add_event(event_id: int, channel_id: int, title: str, time: str, shown: str) -> None:
+    """
+    shown: the embed the event message was sent with, see render_scheduler.snapshot()
+    """
+    sql = "INSERT INTO EVENTS (MESSAGE_ID, CHANNEL_ID, TITLE, TIME, SHOWN) VALUES (?, ?, ?, ?, ?)"
+    async with event_db.acquire() as conn:
+        await conn.execute(sql, [event_id, channel_id, title, time, shown])
+        await conn.commit()
 
-async def get_event() -> tuple[str, str, int, int]:
-    sql = "SELECT * FROM EVENT"
-    async with aiosqlite.connect(globals.EVENT_DATABASE_NAME) as conn:
+
+async def update_event(event_id: int, title: str, time: str) -> None:
+    sql = "UPDATE EVENTS SET TITLE = ?, TIME = ? WHERE MESSAGE_ID = ?"
+    async with event_db.acquire() as conn:
+        await conn.execute(sql, [title, time, event_id])
+        await conn.commit()
+
+
+async def close_event(event_id: int, status: str = 'CLOSED') -> None:
+    """
+    End an event: 'CLOSED' once sign-ups are done, 'CANCELLED' if it was deleted.
+    Its row, pages and sign-ups (ATTENDANCE) are kept, so this costs the same however many users there are.
+    """
+    sql = "UPDATE EVENTS SET STATUS = ? WHERE MESSAGE_ID = ?"
+    async with event_db.acquire() as conn:
+        await conn.execute(sql, [status, event_id])
+        await conn.commit()
+
+
+async def get_events() -> list[tuple[int, int, str, str, Optional[str]]]:
+    """
+    (message ID, channel ID, title, time, shown) of every active event, oldest first. shown is the embed the event
+    message shows (render_scheduler.snapshot()), None for events from before it was stored
+    """
+    sql = "SELECT MESSAGE_ID, CHANNEL_ID, TITLE, TIME, SHOWN FROM EVENTS WHERE STATUS = 'OPEN' ORDER BY MESSAGE_ID"
+    async with event_db.acquire() as conn:
+        async with conn.execute(sql) as cursor:
+            return await cursor.fetchall()
+
+
+async def save_event_render(event_id: int, shown: str, pages: list[tuple[int, Optional[str]]]) -> None:
+    """
+    Store what the event message shows, and the IDs of its continuation messages with what they show, in page order
+    as [(message ID, shown)]. See RenderScheduler
+    """
+    async with event_db.acquire() as conn:
+        await conn.execute("UPDATE EVENTS SET SHOWN = ? WHERE MESSAGE_ID = ?", [shown, event_id])
+        await conn.execute("DELETE FROM EVENT_PAGES WHERE EVENT_ID = ?", [event_id])
+        await conn.executemany("INSERT INTO EVENT_PAGES (EVENT_ID, PAGE, MESSAGE_ID, SHOWN) VALUES (?, ?, ?, ?)",
+                               [(event_id, page, message_id, page_shown)
+                                for page, (message_id, page_shown) in enumerate(pages, start=1)])
+        await conn.commit()
+
+
+async def get_event_pages(event_id: int) -> list[tuple[int, Optional[str]]]:
+    """
+    (message ID, shown) of the event's continuation messages, in page order
+    """
+    sql = "SELECT MESSAGE_ID, SHOWN FROM EVENT_PAGES WHERE EVENT_ID = ? ORDER BY PAGE"
+    async with event_db.acquire() as conn:
+        async with conn.execute(sql, [event_id]) as cursor:
+            return await cursor.fetchall()
+
+
+async def get_jobs() -> list[tuple[int, str, int, float, Optional[str]]]:
+    """
+    (job ID, kind, event ID, due, payload) of every pending job
+    """
+    sql = "SELECT JOB_ID, KIND, EVENT_ID, DUE, PAYLOAD FROM JOBS"
+    async with event_db.acquire() as conn:
+        async with conn.execute(sql) as cursor:
+            return await cursor.fetchall()
+
+
+async def replace_event_jobs(event_id: int, kind: str, jobs: list[tuple[float, Optional[str]]]) -> list[int]:
+    """
+    Replace the event's pending jobs of this kind with `jobs`, [(due, payload)]. Returns the new jobs' IDs.
+    """
+    ids = []
+    async with event_db.acquire() as conn:
+        await conn.execute("DELETE FROM JOBS WHERE EVENT_ID = ? AND KIND = ?", [event_id, kind])
+        for due, payload in jobs:
+            cursor = await conn.execute("INSERT INTO JOBS (KIND, EVENT_ID, DUE, PAYLOAD) VALUES (?, ?, ?, ?)",
+                                        [kind, event_id, due, payload])
+            ids.append(cursor.lastrowid)
+        await conn.commit()
+
+    return ids
+
+
+async def update_job_payload(job_id: int, payload: Optional[str]) -> None:
+    async with event_db.acquire() as conn:
+        await conn.execute("UPDATE JOBS SET PAYLOAD = ? WHERE JOB_ID = ?", [payload, job_id])
+        await conn.commit()
+
+
+async def delete_job(job_id: int) -> None:
+    async with event_db.acquire() as conn:
+        await conn.execute("DELETE FROM JOBS WHERE JOB_ID = ?", [job_id])
+        await conn.commit()
+
+
+async def delete_event_jobs(event_id: int) -> None:
+    async with event_db.acquire() as conn:
+        await conn.execute("DELETE FROM JOBS WHERE EVENT_ID = ?", [event_id])
+        await conn.commit()
+
+
+async def adopt_legacy_attendance() -> None:
+    """
+    Give the sign-ups that were migrated from USERS.STATUS (event ID 0) to the event that was active at the time,
+    or drop them if there was none. Does nothing once they have been adopted.
+    """
+    events_ = await get_events()
+    async with user_db.acquire() as conn:
+        if len(events_) == 1:
+            await conn.execute("UPDATE ATTENDANCE SET EVENT_ID = ? WHERE EVENT_ID = 0", [events_[0][0]])
+        else:
+            await conn.execute("DELETE FROM ATTENDANCE WHERE EVENT_ID = 0")
+        await conn.commit()
+
+
+def encode_profession(prof_array: Union[list, tuple]) -> tuple:
+    """
+    prof_array: class, level, units, march_size, alliance, mm_traps, skins (long form, as stored in USERS)
+    """
+    class_, level, units, march_size, alliance, mm_traps, skins = prof_array
+    return profession_config.get().encode_profession(class_, level, units, march_size, mm_traps, skins)
+
+
+async def reencode_professions() -> int:
+    """
+    Bring the encoded profession columns in line with the long-form columns and the active profession config.
+    Needed after the migration that added them, and whenever the options in the config change order.
+    Only rows whose encoding changed are written. Returns the number of rows updated.
+    """
+    sql = f"SELECT DISCORD_ID, CLASS, LEVEL, UNIT, MARCH_SIZE, ALLIANCE, MM_TRAPS, SKINS, {ENCODED_COLUMNS} FROM USERS"
+    async with user_db.acquire() as conn:
+        # read and write in one transaction, holding the write lock, so that a profession updated on another
+        # connection in between is not overwritten with the encoding of the old one
+        await conn.execute("BEGIN IMMEDIATE")
         async with conn.cursor() as cursor:
             await cursor.execute(sql)
-            entry = await cursor.fetchone()
+            rows = await cursor.fetchall()
 
-    return entry
+        updates = []
+        for row in rows:
+            encoded = encode_profession(row[CLASS_IND:SKINS_IND + 1])
+            if encoded != tuple(row[SKINS_IND + 1:]):
+                updates.append((*encoded, row[ID_IND]))
+
+        if updates:
+            await conn.executemany("UPDATE USERS SET LEVEL_RANK = ?, MARCH_RANK = ?, UNIT_MASK = ?, TRAPS_MASK = ?, "
+                                   "SKINS_MASK = ? WHERE DISCORD_ID = ?", updates)
+            logging.info(f'Re-encoded professions of {len(updates)} user(s)')
+        await conn.commit()
+
+    return len(updates)
 
 
 def get_profession_abbreviation_dict(category: str) -> dict:
     # return a dictionary that converts long-form profession info to shortened versions
-    with open(globals.PROFESSION_INFO_JSON, 'r') as f:
-        obj = load(f)
-    dat = obj[category]
-    return dat['convert_long_to_short']
+    return profession_config.get().category(category).long_to_short
 
 
 def info_embed(entry: Union[list, tuple], descr='', first_entry=False) -> discord.Embed:
     # extract values from entry
-    class_, level, units, march_size, alliance, mm_traps, skins, status, lottery = entry[1:10]
+    class_, level, units, march_size, alliance, mm_traps, skins = entry[CLASS_IND:SKINS_IND + 1]
+    lottery = entry[LOTTERY_IND]
 
     # format values for display
     # unitDict = get_profession_abbreviation_dict('units')
@@ -110,20 +348,16 @@ def info_embed(entry: Union[list, tuple], descr='', first_entry=False) -> discor
     lottery_args = {'name': 'Lottery', 'value': lottery}
     whitespace_args = {'name': '\u200b', 'value': '\u200b'}     # used to make an empty field for alignment
 
-    if not first_entry:
+    if not events:
+        descr += 'There is no event open for signups.'
+    elif not first_entry:
         # to avoid confusion, only show the user's status if this was a successful signup.
         # first_entry status will always be "NO"
-        if globals.eventChannel:
-            # if there is an active event, put the event and the user's status in the description field of the embed
-            descr += f'You are **{status}** for {globals.eventInfo}\n' \
-                     f'[Event Message]({globals.eventMessage.jump_url})'
-        else:
-            descr += 'There is no event open for signups.'
+        # if there are active events, put each event and the user's status in the description field of the embed
+        descr += '\n'.join(f'You are **{event.status(entry[ID_IND])}** for {event.info}\n'
+                           f'[Event Message]({event.jump_url})' for event in events)
     else:
-        if globals.eventChannel:
-            descr += f'[Event Message]({globals.eventMessage.jump_url})'
-        else:
-            descr += 'There is no event open for signups.'
+        descr += '\n'.join(f'[Event Message]({event.jump_url})' for event in events)
 
     embed = discord.Embed(title='Database Info', description=descr, color=discord.Color.dark_red())
 
@@ -169,78 +403,105 @@ async def update_profession(discord_id: discord.Member.id, prof_array: list) ->
     """
 
     sql = "UPDATE USERS SET CLASS = ?, LEVEL = ?, UNIT = ?, MARCH_SIZE = ?, ALLIANCE = ?, " \
-          "MM_TRAPS = ?, SKINS = ? WHERE DISCORD_ID = ?"
-    values = [*prof_array, discord_id]
+          "MM_TRAPS = ?, SKINS = ?, LEVEL_RANK = ?, MARCH_RANK = ?, UNIT_MASK = ?, TRAPS_MASK = ?, SKINS_MASK = ? " \
+          "WHERE DISCORD_ID = ?"
+    values = [*prof_array, *encode_profession(prof_array), discord_id]
 
-    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+    async with user_db.acquire() as conn:
         async with conn.cursor() as cursor:
             await cursor.execute(sql, values)
             await conn.commit()
 
+    entry_cache.update(discord_id, dict(zip(range(CLASS_IND, SKINS_IND + 1), prof_array)))
+
 
 async def update_lotto(discord_id: discord.Member.id, lotto: int) -> None:
     sql = "UPDATE USERS SET LOTTERY = ? WHERE DISCORD_ID = ?"
     values = [lotto, discord_id]
 
-    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+    async with user_db.acquire() as conn:
         async with conn.cursor() as cursor:
             await cursor.execute(sql, values)
             await conn.commit()
 
+    entry_cache.update(discord_id, {LOTTERY_IND: lotto})
+
 
-async def update_status(discord_id: discord.Member.id, status: str) -> None:
+async def update_status(event_id: int, discord_id: discord.Member.id, status: str) -> None:
     """
     Called by event_interaction.handle_interaction() to update status when a member clicks event embed button
     """
-    # shouldn't need to check on event status as they can only update if there is an active event. But do it anyways
-    if globals.eventMessage is None:
-        logging.error('update_status called when globals.eventMessage was \'None\'')
-        return
+    await user_writes.put((event_id, discord_id), 'ATTENDANCE', (status, time.time()))
 
-    sql = "UPDATE USERS SET STATUS = ? WHERE DISCORD_ID = ?"
-    values = [status, discord_id]
 
-    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
-        async with conn.cursor() as cursor:
-            await cursor.execute(sql, values)
-            await conn.commit()
+def attendance_filter(statuses: list[str]) -> tuple[str, str]:
+    """
+    FROM clause and WHERE condition for the users with one of `statuses` for an event. Bind the event ID, then the
+    statuses.
 
+    Only "NO" needs every user, since users that did not sign up are "NO". Otherwise only the event's rows are read,
+    through the ATTENDANCE_STATUS index.
+    """
+    placeholders = ', '.join('?' * len(statuses))
+    if 'NO' in statuses:
+        return USERS_ATTENDANCE, f"COALESCE(A.STATUS, 'NO') IN ({placeholders})"
+    return EVENT_ATTENDEES, f"A.STATUS IN ({placeholders})"
 
-async def update_interacted_with_event(discord_id: discord.Member.id, intxn: int) -> None:
-    sql = "UPDATE USERS SET INTERACTED_WITH_EVENT = ? WHERE DISCORD_ID = ?"
-    values = [intxn, discord_id]
 
-    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
-        async with conn.cursor() as cursor:
-            await cursor.execute(sql, values)
-            await conn.commit()
+async def get_event_statuses(event_id: int) -> list[tuple[int, str]]:
+    """
+    (discord ID, status) of everyone who signed up for the event, in the order they last changed status
+    """
+    sql = "SELECT DISCORD_ID, STATUS FROM ATTENDANCE WHERE EVENT_ID = ? AND STATUS IN ('YES', 'MAYBE', 'NO') " \
+          "ORDER BY STATUS_TIME, DISCORD_ID"
 
+    await user_writes.flush()
+    async with user_db.acquire() as conn:
+        async with conn.execute(sql, [event_id]) as cursor:
+            return await cursor.fetchall()
 
-# this one can just run immediately rather than go into write-loop
-async def reset_user_event_data() -> None:
-    sql = "UPDATE USERS SET STATUS = ?, INTERACTED_WITH_EVENT = ?"
-    val = ["NO", 0]
 
-    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
-        async with conn.cursor() as cursor:
-            await cursor.execute(sql, val)
-            await conn.commit()
+async def get_audience_ids(event_id: int, audience: str, after: int = 0) -> list[int]:
+    """
+    IDs of the users in a reminder audience of the event (see globals.REMINDER_STAGES), in ID order. Only IDs greater
+    than `after`, so a reminder can resume where it stopped
+    """
+    await user_writes.flush()
+    async with user_db.acquire() as conn:
+        async with conn.execute(AUDIENCE_SQL[audience], {'event': event_id, 'after': after}) as cursor:
+            rows = await cursor.fetchall()
+
+    return [row[0] for row in rows]
 
 
-async def all_of_category(category: str, value: Union[str, int], guild=None, status='YES',
-                          display_name=False) -> Optional[list[tuple]]:
+async def confirm_attendance(discord_id: int, event_ids: list[int]) -> None:
     """
-    return a list of all user tuples that satisfy a condition
+    Mark the user's YES sign-ups of these events as confirmed
+    """
+    sql = "UPDATE ATTENDANCE SET CONFIRMED = 1 WHERE DISCORD_ID = ? AND STATUS = 'YES' " \
+          f"AND EVENT_ID IN ({', '.join('?' * len(event_ids))})"
+    # the sign-up itself may still be queued
+    await user_writes.flush()
+    async with user_db.acquire() as conn:
+        await conn.execute(sql, [discord_id, *event_ids])
+        await conn.commit()
+
+
+async def all_of_category(category: str, value: Union[str, int], event_id: Optional[int] = None, guild=None,
+                          status='YES', display_name=False) -> Optional[list[tuple]]:
+    """
+    return a list of all user tuples that satisfy a condition. Statuses are those of event_id; users that did not
+    sign up for it are "NO"
     """
     # all (ID, prof) of class
     if category == "class":
-        sql = "SELECT DISCORD_ID, CLASS, LEVEL, UNIT, MARCH_SIZE, ALLIANCE, MM_TRAPS, SKINS " \
-              "FROM USERS WHERE "
+        sql = "SELECT U.DISCORD_ID, U.CLASS, U.LEVEL, U.UNIT, U.MARCH_SIZE, U.ALLIANCE, U.MM_TRAPS, U.SKINS "
         if status in ['YES', 'MAYBE', 'NO']:
-            sql += "STATUS = ? AND CLASS = ?"
-            values = [status, value]
+            source, condition = attendance_filter([status])
+            sql += f"FROM {source} WHERE {condition} AND U.CLASS = ?"
+            values = [event_id, status, value]
         elif status == 'ALL':
-            sql += "CLASS = ?"
+            sql += "FROM USERS U WHERE U.CLASS = ?"
             values = [value]
         else:
             logging.info(f'ERROR: status "{status}" not recognized.')
@@ -248,46 +509,128 @@ async def all_of_category(category: str, value: Union[str, int], guild=None, sta
 
     # all ID attending event who have opted in to lotto
     elif category == "lotto":
-        sql = "SELECT DISCORD_ID FROM USERS WHERE STATUS = ? AND LOTTERY = ?"
-        values = [status, value]
+        source, condition = attendance_filter([status])
+        sql = f"SELECT U.DISCORD_ID FROM {source} WHERE {condition} AND U.LOTTERY = ?"
+        values = [event_id, status, value]
 
     # just used for checking maybes. Could be used for repopulating embed name fields if bot restarts.
     elif category == 'status':
-        sql = "SELECT DISCORD_ID FROM USERS WHERE STATUS = ?"
-        values = [value]
+        source, condition = attendance_filter([value])
+        sql = f"SELECT U.DISCORD_ID FROM {source} WHERE {condition}"
+        values = [event_id, value]
 
     elif category == 'interacted_with_event':
-        sql = "SELECT DISCORD_ID, STATUS, ALLIANCE FROM USERS WHERE INTERACTED_WITH_EVENT = ?"
-        values = [value]
+        sql = "SELECT U.DISCORD_ID, COALESCE(A.STATUS, 'NO'), U.ALLIANCE "
+        if value:
+            sql += f"FROM {EVENT_ATTENDEES}"
+        else:
+            sql += f"FROM {USERS_ATTENDANCE} WHERE A.DISCORD_ID IS NULL"
+        values = [event_id]
 
     else:
         logging.info(f'ERROR: category "{category}" not recognized.')
         return
 
-    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+    await user_writes.flush()
+    async with user_db.acquire() as conn:
         async with conn.cursor() as cursor:
             await cursor.execute(sql, values)
             entries = await cursor.fetchall()
 
     if display_name:
-        if not guild:
-            logging.error('Failed to provide guild object for display names.')
-        display_name_entries = []
-        for entry in entries:
-            name = await get_display_name_from_id(guild, entry[0], require_csv_role=True)
-            if not name:
-                continue
-            new_entry = (name, *entry[1:])
-            display_name_entries.append(new_entry)
-        return display_name_entries
+        return await resolve_display_names(guild, entries)
 
     else:
         return entries
 
 
+async def get_report_entries(guild: discord.Guild, event_id: Optional[int] = None,
+                             statuses: Optional[list[str]] = None, interacted_only=False) -> list[tuple]:
+    """
+    Returns every USERS row needed for a report in one query, with the discord ID replaced by the display name.
+    Rows have the same layout as get_entry() followed by the encoded profession columns and the sort rank, so the
+    *_IND indices apply. Their status and interaction flag are those of event_id; users that did not sign up for it
+    are "NO".
+
+    The sort rank orders the rows like the sorted sections of the CSV: by level and march size (both descending),
+    then by alliance, ties in ID order. The rows themselves are in ID order, which the rest of the CSV keeps.
+
+    statuses:           only return users with one of these statuses. None for all users
+    interacted_only:    only return users that interacted with the event
+    """
+    # alliances in config order, ones that are no longer options last
+    alliances = profession_config.get().category('alliance').options
+    allianceRank = "CASE U.ALLIANCE " + "".join(f"WHEN ? THEN {rank} " for rank in range(len(alliances))) + \
+                   f"ELSE {len(alliances)} END"
+    sortRank = f"ROW_NUMBER() OVER (ORDER BY U.LEVEL_RANK DESC, U.MARCH_RANK DESC, {allianceRank}, U.DISCORD_ID)"
+
+    source = USERS_ATTENDANCE
+    conditions = []
+    values = [*alliances, event_id]
+    if statuses is not None:
+        source, condition = attendance_filter(statuses)
+        conditions.append(condition)
+        values.extend(statuses)
+    if interacted_only:
+        # only users that signed up: start from the event's ATTENDANCE rows instead of every user
+        source = EVENT_ATTENDEES
+
+    sql = f"SELECT {EVENT_ENTRY_COLUMNS}, {EVENT_ENCODED_COLUMNS}, {sortRank} FROM {source}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    # same row order as the old per-category queries, so ties sort the same way in the CSV
+    sql += " ORDER BY U.DISCORD_ID"
+
+    await user_writes.flush()
+    async with user_db.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(sql, values)
+            entries = await cursor.fetchall()
+
+    return await resolve_display_names(guild, entries)
+
+
+def partition_by_status_and_class(entries: list[tuple]) -> dict[str, dict[str, list[tuple]]]:
+    """
+    Split report entries into {status: {class: [entries]}}, keeping their order.
+    Status 'ALL' holds every entry of the class regardless of status.
+    Every status/class combination is present, even if empty.
+    """
+    partitions = {status: {'CE': [], 'MM': []} for status in ['YES', 'MAYBE', 'NO', 'ALL']}
+    for entry in entries:
+        class_ = entry[CLASS_IND]
+        if class_ not in partitions['ALL']:
+            continue
+        partitions['ALL'][class_].append(entry)
+        if entry[STATUS_IND] in partitions:
+            partitions[entry[STATUS_IND]][class_].append(entry)
+    return partitions
+
+
+async def resolve_display_names(guild: discord.Guild, entries: list[tuple]) -> list[tuple]:
+    """
+    Replace the discord ID at the start of each entry with the member's display name.
+    Entries of users that have no usable display name (see clean_display_name) are dropped.
+    """
+    if not guild:
+        logging.error('Failed to provide guild object for display names.')
+
+    # fetched in batches if the guild's members were not all cached at startup
+    members = await member_cache.resolve(guild, [entry[0] for entry in entries])
+
+    display_name_entries = []
+    for entry in entries:
+        name = clean_display_name(guild, entry[0], members.get(entry[0]), require_csv_role=True)
+        if not name:
+            continue
+        display_name_entries.append((name, *entry[1:]))
+    return display_name_entries
+
+
 async def dump_db(filename: str) -> discord.File:
+    await user_writes.flush()
     with open(filename, 'w') as file:
-        async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+        async with user_db.acquire() as conn:
             async for line in conn.iterdump():
                 file.write(line + '\n')
 
@@ -299,7 +642,15 @@ async def get_display_name_from_id(guild: discord.Guild, discord_id: discord.Use
     Get a member's display name from a guild, stripping emojis and non-ascii chars
     """
     # Get the member object from main 1508 guild to get their display name
-    member = guild.get_member(discord_id)
+    member = await member_cache.get(guild, discord_id)
+    return clean_display_name(guild, discord_id, member, require_csv_role)
+
+
+def clean_display_name(guild: discord.Guild, discord_id: int, member: Optional[discord.Member],
+                       require_csv_role=False) -> Optional[str]:
+    """
+    The member's display name, stripping emojis and non-ascii chars. member is None if they are not in guild
+    """
     if member is None:
         logging.info(f'Get display name failed: discord ID {discord_id} is not a member of guild {guild}.')
         return None
@@ -328,9 +679,13 @@ async def get_display_name_from_id(guild: discord.Guild, discord_id: discord.Use
 
 
 async def delete_user(discord_id: int) -> None:
-    async with aiosqlite.connect(globals.USER_DATABASE_NAME) as conn:
+    user_writes.discard(discord_id)
+    async with user_db.acquire() as conn:
         async with conn.cursor() as cursor:
             sql = "DELETE FROM USERS WHERE discord_ID = ?"
             values = [discord_id]
             await cursor.execute(sql, values)
+            await cursor.execute("DELETE FROM ATTENDANCE WHERE discord_ID = ?", values)
             await conn.commit()
+
+    entry_cache.invalidate(discord_id)
@@ -0,0 +1,251 @@
+import discord
+import asyncio
+import itertools
+import time
+from typing import Awaitable, Callable, Optional, Union
+
+import logging
+
+from . import globals
+
+# priorities, lowest is sent first
+CONFIRMATION = 0    # replies to something the user just did: clicks, prompts, errors
+NORMAL = 1
+BULK = 2            # reminders and other mass DMs
+
+# attempts per message for rate limits and Discord server errors
+MAX_ATTEMPTS = 3
+
+
+class DMQueue:
+    """
+    Outbound direct messages, sent by a bounded pool of worker tasks in priority order (FIFO within a priority).
+
+    Callers enqueue and go on; enqueue() returns a future that resolves to the sent message, or None if the message
+    was not delivered. Sending never raises into the caller.
+
+    Users whose DMs are closed (Forbidden) are remembered for `closed_ttl` seconds and skipped meanwhile.
+    A rate limit on a route (creating a DM channel, or sending into one) pauses every worker for that route until
+    it resets, so the workers don't spend their attempts on it.
+    """
+
+    __slots__ = ('workers', 'closed_ttl', 'sent', 'failed', 'skipped',
+                 '_queue', '_tasks', '_closed', '_cooldowns', '_seq')
+
+    def __init__(self, workers: int, closed_ttl: float):
+        self.workers = workers
+        self.closed_ttl = closed_ttl
+
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+
+        self._queue = None
+        self._tasks = []
+        # {discord_id: time.monotonic() at which to try them again}
+        self._closed = {}
+        # {route: time.monotonic() at which its rate limit resets}
+        self._cooldowns = {}
+        # tie-breaker, keeps FIFO order within a priority
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def is_closed(self, discord_id: int) -> bool:
+        retry_at = self._closed.get(discord_id)
+        if retry_at is None:
+            return False
+        if time.monotonic() >= retry_at:
+            del self._closed[discord_id]
+            return False
+        return True
+
+    def enqueue(self, user: Union[discord.User, discord.Member], priority: int = NORMAL,
+                **kwargs) -> asyncio.Future:
+        """
+        Queue user.send(**kwargs)
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self.is_closed(user.id):
+            self.skipped += 1
+            future.set_result(None)
+            return future
+
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        self._queue.put_nowait((priority, next(self._seq), user, kwargs, future))
+        return future
+
+    async def _worker(self) -> None:
+        while True:
+            priority, _, user, kwargs, future = await self._queue.get()
+            try:
+                if future.done():
+                    # cancelled by the caller
+                    continue
+                message = await self._send(user, kwargs)
+                if not future.done():
+                    future.set_result(message)
+            except Exception:
+                logging.exception(f'Failed to DM user {user.id}.')
+                self.failed += 1
+                if not future.done():
+                    future.set_result(None)
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, user: Union[discord.User, discord.Member], kwargs: dict) -> Optional[discord.Message]:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            if self.is_closed(user.id):
+                self.skipped += 1
+                return None
+
+            route = 'create_dm' if user.dm_channel is None else 'send_dm'
+            await self._wait_for_route(route)
+            try:
+                message = await user.send(**kwargs)
+
+            except discord.Forbidden:
+                self._closed[user.id] = time.monotonic() + self.closed_ttl
+                logging.info(f'DMs of user {user.id} are closed, skipping them for {self.closed_ttl:.0f}s.')
+                self.skipped += 1
+                return None
+
+            except getattr(discord, 'RateLimited', ()) as e:
+                # only raised when discord.py would wait longer than its max_ratelimit_timeout. The discord.py commit
+                # pinned in requirements.txt predates RateLimited, then this catches nothing
+                self._cool_down(route, e.retry_after)
+
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    self._cool_down(route, float(e.response.headers.get('Retry-After', 1)))
+                elif e.status >= 500 and attempt < MAX_ATTEMPTS:
+                    await asyncio.sleep(2 ** attempt)
+                else:
+                    raise
+
+            else:
+                self.sent += 1
+                return message
+
+        logging.error(f'Gave up on DM to user {user.id} after {MAX_ATTEMPTS} attempts.')
+        self.failed += 1
+        return None
+
+    def _cool_down(self, route: str, retry_after: float) -> None:
+        logging.warning(f'Rate limited on DM route "{route}", pausing it for {retry_after:.1f}s.')
+        self._cooldowns[route] = max(self._cooldowns.get(route, 0), time.monotonic() + retry_after)
+
+    async def _wait_for_route(self, route: str) -> None:
+        delay = self._cooldowns.get(route, 0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self),
+            'sent': self.sent,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'closed_dms': len(self._closed)
+        }
+
+    async def close(self, timeout: float) -> None:
+        """
+        Give the queued messages up to `timeout` seconds to go out, then stop the workers
+        """
+        if self._queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f'{len(self)} DMs were not sent before shutdown.')
+
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+
+_queue = DMQueue(globals.DM_QUEUE_WORKERS, globals.DM_CLOSED_CACHE_SECONDS)
+
+
+def enqueue(user: Union[discord.User, discord.Member], priority: int = NORMAL, **kwargs) -> asyncio.Future:
+    """
+    Queue a DM to user, see DMQueue.enqueue(). Await the returned future for the sent message (None if not sent).
+    """
+    return _queue.enqueue(user, priority, **kwargs)
+
+
+def is_closed(discord_id: int) -> bool:
+    return _queue.is_closed(discord_id)
+
+
+async def fan_out(recipients: list[tuple[int, Optional[discord.Member]]], counts: Optional[dict] = None,
+                  progress: Optional[Callable[[int, dict], Awaitable[None]]] = None, **kwargs) -> dict:
+    """
+    Send the same DM to many users, at BULK priority. One recipient failing does not affect the others.
+
+    recipients: [(discord_id, member)], in the order to send. member is None if they can't be reached (left the guild)
+    counts: {'delivered', 'failed', 'skipped'} to add to, e.g. from before a restart
+    progress: awaited with (discord_id of the last recipient, counts) after every DM_FAN_OUT_BATCH_SIZE recipients,
+        and when cancelled. Everyone up to that recipient has been sent to (or given up on)
+
+    Returns the counts.
+    """
+    counts = dict(counts) if counts else {'delivered': 0, 'failed': 0, 'skipped': 0}
+    batch_size = globals.DM_FAN_OUT_BATCH_SIZE
+    for start in range(0, len(recipients), batch_size):
+        batch = recipients[start:start + batch_size]
+
+        # the workers send them, a few at a time and behind any click confirmations
+        sending = [(discord_id, enqueue(member, BULK, **kwargs) if member is not None else None)
+                   for discord_id, member in batch]
+
+        done = 0
+        try:
+            for discord_id, future in sending:
+                if future is not None:
+                    await future
+                _tally(counts, discord_id, future)
+                done += 1
+
+        except asyncio.CancelledError:
+            # keep the recipients that were done before the cancel, the workers drop the rest of the batch
+            for discord_id, future in sending[done:]:
+                if future is not None and (not future.done() or future.cancelled()):
+                    break
+                _tally(counts, discord_id, future)
+                done += 1
+            for _, future in sending[done:]:
+                if future is not None:
+                    future.cancel()
+            if done and progress is not None:
+                await progress(sending[done - 1][0], counts)
+            raise
+
+        if progress is not None:
+            await progress(batch[-1][0], counts)
+
+    return counts
+
+
+def _tally(counts: dict, discord_id: int, future: Optional[asyncio.Future]) -> None:
+    if future is None:
+        counts['skipped'] += 1
+    elif future.result() is not None:
+        counts['delivered'] += 1
+    elif is_closed(discord_id):
+        counts['skipped'] += 1
+    else:
+        counts['failed'] += 1
+
+
+def stats() -> dict:
+    return _queue.stats()
+
+
+async def close(timeout: float = 10) -> None:
+    await _queue.close(timeout)
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from typing import Optional
+
+
+class EntryCache:
+    """
+    Bounded LRU cache of USERS rows keyed by discord ID.
+
+    Filled by db.get_entry() and kept up to date by the db.* write functions (write-through), so repeat clicks
+    from the same user never touch SQLite.
+
+    A fill is done in two steps, begin_fill() before the query and end_fill() after it. If the user is written to
+    while the query is in flight, the (possibly stale) row is returned to the caller but not cached.
+    """
+
+    __slots__ = ('max_size', 'hits', 'misses', '_entries', '_filling')
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        # {discord_id: written_during_fill}
+        self._filling = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, discord_id: int) -> Optional[tuple]:
+        entry = self._entries.get(discord_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(discord_id)
+        return entry
+
+    def put(self, discord_id: int, entry: tuple) -> None:
+        self._mark_written(discord_id)
+        self._entries[discord_id] = tuple(entry)
+        self._entries.move_to_end(discord_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def update(self, discord_id: int, changes: dict) -> None:
+        """
+        Write-through for a partial update. changes is {entry_index: new_value}
+        """
+        self._mark_written(discord_id)
+        entry = self._entries.get(discord_id)
+        if entry is None:
+            return
+
+        entry = list(entry)
+        for ind, value in changes.items():
+            entry[ind] = value
+        self._entries[discord_id] = tuple(entry)
+
+    def invalidate(self, discord_id: int) -> None:
+        self._mark_written(discord_id)
+        self._entries.pop(discord_id, None)
+
+    def begin_fill(self, discord_id: int) -> None:
+        self._filling.setdefault(discord_id, False)
+
+    def end_fill(self, discord_id: int, entry: Optional[tuple]) -> None:
+        # a second fill of the same ID running concurrently finds nothing here and does not cache
+        written = self._filling.pop(discord_id, True)
+        if entry is not None and not written:
+            self.put(discord_id, entry)
+
+    def _mark_written(self, discord_id: int) -> None:
+        if discord_id in self._filling:
+            self._filling[discord_id] = True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -5,7 +5,7 @@ import traceback
 import sys
 
 import logging
-from . import globals
+from . import globals, dm_queue
 
 
 class CommandErrorHandler(commands.Cog):
@@ -109,6 +109,6 @@ class CommandErrorHandler(commands.Cog):
             await ctx.message.delete()
 
         if globals.SEND_ERROR_TO_DM:
-            await ctx.author.send(embed=embed)
+            dm_queue.enqueue(ctx.author, dm_queue.CONFIRMATION, embed=embed)
         else:
             await ctx.send(embed=embed)
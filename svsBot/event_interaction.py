@@ -1,86 +1,154 @@
 import discord
 import asyncio
+from contextlib import asynccontextmanager
 
-lock = asyncio.Lock()
+from typing import Optional, Union
 
 import logging
 
-from . import helpers, globals, db
+from . import helpers, globals, db, dm_queue, member_cache
+from . event_registry import Event, events
+from . job_scheduler import jobs
+from . event_roster import EventRoster
+from . latency_histogram import LatencyHistogram
+from . render_scheduler import RenderScheduler
+
+
+class UserLocks:
+    """
+    One asyncio.Lock per discord ID. A user's lock is dropped once nobody holds or waits for it.
+    """
+
+    __slots__ = ('_locks',)
+
+    def __init__(self):
+        # {discord_id: [lock, number of holders and waiters]}
+        self._locks = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, discord_id: int):
+        item = self._locks.get(discord_id)
+        if item is None:
+            item = self._locks[discord_id] = [asyncio.Lock(), 0]
+        item[1] += 1
+        try:
+            async with item[0]:
+                yield
+        finally:
+            item[1] -= 1
+            if not item[1]:
+                del self._locks[discord_id]
+
+
+user_locks = UserLocks()
+
+# time from a click to its acknowledgement. Discord fails interactions that are not acknowledged within 3 seconds
+ack_latency = LatencyHistogram((0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 3))
+
+
+def roster_name(user: Union[discord.User, discord.Member]) -> str:
+    """
+    The name shown for the user on the event embed
+    """
+    return user.display_name[:globals.MAX_NAME_LENGTH_IN_EMBED_FIELD]
+
+
+async def load_roster(event: Event) -> EventRoster:
+    """
+    Rebuild the roster of an event from the database in one query, e.g. after a restart. Members that left
+    the server are left out, as in the reports.
+    """
+    roster = EventRoster()
+    statuses = await db.get_event_statuses(event.id)
+    members = await member_cache.resolve(event.guild, [discord_id for discord_id, _ in statuses])
+    for discord_id, status in statuses:
+        member = members.get(discord_id)
+        if member is not None:
+            roster.set(discord_id, roster_name(member), status)
+    return roster
 
-fieldPrefix = '>>> \u200b'  # quote block and whitespace char
 
 class EventButtonsView(discord.ui.View):
-    __slots__ = ('parent_message', 'last_statuses')
+    __slots__ = ('event', 'roster', 'renderer')
 
-    def __init__(self, parent_message: discord.Message):
+    def __init__(self, event: Event, embed: discord.Embed,
+                 pages: list[Union[discord.Message, discord.PartialMessage]] = (),
+                 roster: Optional[EventRoster] = None, shown: Optional[list[Optional[str]]] = None):
         super().__init__(timeout=None)
-        self.parent_message = parent_message
-        self.last_statuses = {}
+        self.event = event
+        # attendees of the event. After a restart, the roster is loaded from the database, see load_roster()
+        self.roster = roster if roster is not None else EventRoster()
+        # clicks only update the roster; this edits the event message and pages. embed, pages and shown are the
+        # RenderScheduler's
+        self.renderer = RenderScheduler(event.message, embed, self.roster, globals.EVENT_RENDER_INTERVAL_SECONDS,
+                                        pages, shown, on_deleted=self.message_deleted)
 
     @discord.ui.button(label='YES', style=discord.ButtonStyle.success, custom_id='persistent_view:yes')
     async def yes(self, interaction: discord.Interaction, button: discord.ui.Button):
         status = 'YES'
-        if interaction.user.id not in self.last_statuses:
-            await db.update_interacted_with_event(interaction.user.id, 1)
-            self.check_in_field_before_restart(interaction)
         await self.process_click(interaction, status)
 
     @discord.ui.button(label='MAYBE', style=discord.ButtonStyle.secondary, custom_id='persistent_view:maybe')
     async def maybe(self, interaction: discord.Interaction, button: discord.ui.Button):
         status = 'MAYBE'
-        if interaction.user.id not in self.last_statuses:
-            await db.update_interacted_with_event(interaction.user.id, 1)
-            self.check_in_field_before_restart(interaction)
         await self.process_click(interaction, status)
 
     @discord.ui.button(label='NO', style=discord.ButtonStyle.danger, custom_id='persistent_view:no')
     async def no(self, interaction: discord.Interaction, button: discord.ui.Button):
         status = 'NO'
-        if interaction.user.id not in self.last_statuses:
-            await db.update_interacted_with_event(interaction.user.id, 1)
-            self.check_in_field_before_restart(interaction)
         await self.process_click(interaction, status)
 
-    def check_in_field_before_restart(self, interaction):
-        # if the last status of user is None, checks to make sure the bot has not restarted and thus lost their last
-        # status. Does this by checking the raw field values to see if the user's name is in there. If so, sets the
-        # user's last status to the correct value.
-
-        # get the embed
-        emb = self.parent_message.embeds[0]
-        fields = emb.fields
-        for i in range(len(fields)):
-            # check each field for user's truncated name
-            name = interaction.user.display_name[:globals.MAX_NAME_LENGTH_IN_EMBED_FIELD]
-            fieldVal = fields[i].value
-            if name in get_names_list_from_field_value(fieldVal):
-                # if name is found, iterate backwards to get the 'category' of field that it is in (yes, maybe, no)
-                while True:
-                    # strip [124] field count to get title
-                    fieldType = fields[i].name.split()[0]
-                    if fieldType in ['YES', 'MAYBE', 'NO']:
-                        self.last_statuses[interaction.user.id] = fieldType
-                        break
-                    else:
-                        i -= 1
-                break
+    def rename(self, member: discord.Member) -> None:
+        """
+        Show the member's current display name, if they are on the roster
+        """
+        if self.roster.rename(member.id, roster_name(member)):
+            self.renderer.mark_dirty()
+
+    async def message_deleted(self) -> None:
+        """
+        The event message was deleted, e.g. while the bot was down. Nobody can sign up anymore, so cancel the event
+        and its reminders, like Bot.load_event() does when it can't fetch the message
+        """
+        if events.remove(self.event.id) is None:
+            # already being ended
+            return
+
+        logging.error(f'Event message of "{self.event.title}" was deleted, removing the event.')
+        self.stop()
+        await jobs.cancel_event(self.event.id)
+        await db.close_event(self.event.id, 'CANCELLED')
 
     async def process_click(self, interaction, status):
-        async with lock:
+        # acknowledge the click before doing anything else. The rest (database, roster, DMs) finishes afterwards in
+        # this callback's own task, and replies with an ephemeral followup
+        await interaction.response.defer()
+        # measured from the interaction's creation (its snowflake), like Discord's deadline
+        ack_latency.record((discord.utils.utcnow() - interaction.created_at).total_seconds())
+
+        # clicks from the same user are handled in order; different users are handled concurrently. Shared state is
+        # only touched between awaits (roster) or by a single task (renderer), so it needs no lock of its own
+        async with user_locks.hold(interaction.user.id):
             # get the last status of the user, defaults to None
-            last_status = self.last_statuses.get(interaction.user.id, None)
+            last_status = self.roster.status(interaction.user.id)
             # handle interaction
-            output = await handle_interaction(last_status, status, interaction, self.parent_message)
+            output = await handle_interaction(last_status, status, interaction, self.event)
         if output == 'request_entry':
             # handle_intxn returns 'request_entry' when user does not have a database entry
-            # must keep this separate to reduce time spent in 'lock'
-            await helpers.request_entry(interaction.user, event_attempt=True)
-        elif output == 'success':
-            # if field was updated, add/edit key-value pair of discordID-status, to be used if status is changed
-            self.last_statuses[interaction.user.id] = status
+            # must keep this separate to reduce time spent holding the user's lock
+            if await helpers.request_entry(interaction.user, event_attempt=True):
+                await interaction.followup.send('You are not in the database yet. The bot sent you a DM with '
+                                                'instructions.', ephemeral=True)
+            else:
+                await interaction.followup.send('You are not in the database yet, and the bot could not DM you. '
+                                                'Allow direct messages from server members, then try again.',
+                                                ephemeral=True)
 
 
-async def handle_interaction(last_status, status, interaction, parent_message) -> str:
+async def handle_interaction(last_status, status, interaction, event: Event) -> str:
     if last_status == status:  # don't do anything if they are already in this category
         return 'ignore'
 
@@ -88,130 +156,28 @@ async def handle_interaction(last_status, status, interaction, parent_message) -
     entry = await db.get_entry(user.id)
     if not entry:
         # await helpers.request_entry(user, event_attempt=True)
-        # moved request_entry() to the event button to minimize time spent in 'lock'
+        # moved request_entry() to the event button to minimize time spent holding the user's lock
         return 'request_entry'
 
-    # add the user's name to the selected field, and remove it from the last field if applicable
-    await update_event_field(parent_message, user.display_name, status, remove_status=last_status)
+    # move the user to the selected status; the embed is edited with the next batch of changes
+    event.view.roster.set(user.id, roster_name(user), status)
+    event.view.renderer.mark_dirty()
+
     # update the database
-    await db.update_status(user.id, status)
-    # send ephemeral message to eventChannel
-    await interaction.response.send_message(f'Registered as **{status}** for {globals.eventInfo}.', ephemeral=True)
+    await db.update_status(event.id, user.id, status)
+    # send ephemeral message to the event channel (the click was already acknowledged, so this is a followup)
+    await interaction.followup.send(f'Registered as **{status}** for {event.info}.', ephemeral=True)
 
     if last_status is None:  # this is their first response to event
         if status != 'NO':  # only DM them if their response is YES or MAYBE
-            entry = list(entry)
-            entry[db.STATUS_IND] = status
+            # shows their status for each event, from the rosters
             embed = db.info_embed(entry)
-            await user.send(embed=embed)
+            dm_queue.enqueue(user, dm_queue.CONFIRMATION, embed=embed)
     else:
         # if this is not their first response to event, DM them with change-string instead of full embed
-        await user.send(f'Your status has been changed from '
-                        f'**{last_status}** to **{status}** for {globals.eventInfo}')
+        dm_queue.enqueue(user, dm_queue.CONFIRMATION,
+                         content=f'Your status has been changed from '
+                                 f'**{last_status}** to **{status}** for {event.info}')
 
     return 'success'
 
-
-async def update_event_field(message: discord.Message, name: str, status: str, remove_status=None) -> None:
-    """
-    Updates the embed fields with attendee names.
-    First remove names, then add, then resolve empty/new fields to avoid indexing errors.
-
-    Each field has 1024 char limit (use 1000 for safety). The embed has 6000 char limit.
-    """
-    embed = message.embeds[0]
-
-    # truncate names to 8 letters
-    name = name[:globals.MAX_NAME_LENGTH_IN_EMBED_FIELD]
-
-    if remove_status is not None:
-        edit_field_values(embed, name, remove_status, operation='remove')
-
-    edit_field_values(embed, name, status, operation='add')
-
-    await message.edit(embed=embed)
-
-
-def get_field_indices_of_status(fields, status: str) -> list[int]:
-    titles = [field.name.split()[0] for field in fields]
-    maybeIndex = titles.index('MAYBE')
-    noIndex = titles.index('NO')
-    rangeDict = {
-        'YES': [0, maybeIndex],
-        'MAYBE': [maybeIndex, noIndex],
-        'NO': [noIndex, len(titles)]
-    }
-    return rangeDict[status]
-
-
-def get_names_list_from_field_value(field_value: str) -> list[str]:
-    """
-    Parse field-value string into a list of names.
-    Each name ends with "\n", but sometimes discord strips the trailing "\n".
-    """
-    field_value = field_value[len(fieldPrefix):]
-    names = field_value.split('\n')
-    if names[-1] == '':
-        names = names[:-1]
-    return names
-
-
-def edit_field_values(embed, name, status, operation: str):
-    """
-    Adds or removes a name from one of the event-embed fields.
-    """
-    logging.debug(f'\nSTATUS: {status}, OPERATION: {operation}')
-    fields = embed.fields
-    status_range = get_field_indices_of_status(fields, status)
-    names = []
-    for i in range(*status_range):
-        fieldVal = fields[i].value
-        names.extend(get_names_list_from_field_value(fieldVal))
-
-    if operation == 'remove':
-        try:
-            names.remove(name)
-        except ValueError:
-            # if user changed display name after joining event, their old name cannot be removed
-            # there will be a duplicate entry in the embed, but everything else will work fine
-            logging.error(f'NAME: {name} not found in STATUS: {status}. User may have changed display name.')
-            return
-    else:
-        names.append(name)
-
-    numberOfNames = len(names)
-
-    # Build the field-value strings
-    # Each field must start with fieldPrefix. Maximum field length is 1024 chars
-    fieldVals = []
-    fieldVal = fieldPrefix
-    while names:
-        fieldVal += names.pop(0) + '\n'
-        if len(fieldVal) > 1000:
-            # names are capped at globals.MAX_NAME_LENGTH_IN_EMBED_FIELD chars, +1 for '\n'
-            # so len(fieldVal) in this block is in [1001, 1001 + MAX_NAME_LENGTH]
-            fieldVals.append(fieldVal)
-            fieldVal = fieldPrefix
-
-    if fieldVal != fieldPrefix:
-        # Need to append the names after exiting while loop
-        fieldVals.append(fieldVal)
-
-    if fieldVal == fieldPrefix and operation == 'remove':
-        # This happens if a field with only one name had its name removed.
-        # Losing a field messes with the field indices. Easier to keep an empty placeholder field.
-        # Note that the first condition could be true after an "add" operation, without the same issue.
-        fieldVals.append(fieldVal)
-
-    # edit the fields
-    for ind in range(*status_range):
-        fieldVal = fieldVals.pop(0)
-        title = (status + f'  [{numberOfNames}]') if ind == status_range[0] else '\u200b'
-        embed.set_field_at(ind, name=title, value=fieldVal)
-
-    if fieldVals:
-        # Happens if an "add" operation caused overflow, so we need a new field
-        if len(fieldVals) > 1:
-            logging.error('More than 1 fieldVal remaining at end.')
-        embed.insert_field_at(status_range[1], name='\u200b', value=fieldVals.pop())
-
@@ -0,0 +1,50 @@
+import discord
+
+# Discord's limits on a single embed. EMBED_MAX_CHARS counts title, description, field names and values, footer
+# and author name together, same as len(embed)
+EMBED_MAX_CHARS = 6000
+EMBED_MAX_FIELDS = 25
+
+# shown on continuation messages that are no longer needed, e.g. after sign-ups moved from YES to NO
+BLANK_PAGE_DESCRIPTION = '\u200b'
+
+
+def continuation_embed(embed: discord.Embed) -> discord.Embed:
+    return discord.Embed(color=embed.color)
+
+
+def blank_embed(embed: discord.Embed) -> discord.Embed:
+    return discord.Embed(description=BLANK_PAGE_DESCRIPTION, color=embed.color)
+
+
+def layout_pages(embed: discord.Embed, fields: list[tuple[str, str]]) -> list[discord.Embed]:
+    """
+    Lay the attendee fields (EventRoster.render_fields()) out over the event embed, then over as many continuation
+    embeds as needed. Each embed is filled until the next field would not fit in Discord's limits.
+
+    Returns [event embed, continuation embeds...]. The event embed is `embed`, with its fields replaced in place.
+    A status that continues from the previous page gets a title field again, "STATUS (continued)". It leaves out the
+    count, so that a click only edits the pages whose names changed (and the event message, for the counts).
+    """
+    embed.clear_fields()
+    pages = [embed]
+    page = embed
+    # what the title, description, footer, ... leave for the fields
+    budget = EMBED_MAX_CHARS - len(embed)
+
+    status = ''
+    for name, value in fields:
+        if name != '\u200b':
+            status = name.split()[0]
+
+        if len(page.fields) == EMBED_MAX_FIELDS or len(name) + len(value) > budget:
+            page = continuation_embed(embed)
+            pages.append(page)
+            budget = EMBED_MAX_CHARS - len(page)
+            if name == '\u200b':
+                name = f'{status} (continued)'
+
+        page.add_field(name=name, value=value)
+        budget -= len(name) + len(value)
+
+    return pages
@@ -0,0 +1,101 @@
+import discord
+from typing import Optional, Iterator, Union
+
+
+class Event:
+    """
+    An active event: its message, where it was created, and the state that belongs to it.
+
+    The event's ID is the ID of its message. After a restart, message is a discord.PartialMessage.
+    """
+
+    __slots__ = ('message', 'channel', 'title', 'time', 'view')
+
+    def __init__(self, message: Union[discord.Message, discord.PartialMessage], title: str, time: str):
+        self.message = message
+        self.channel = message.channel
+        self.title = title
+        # formatted discord timestamp, "<t:unix time>"
+        self.time = time
+        # EventButtonsView, holds the attendee roster and edits the event message
+        self.view = None
+
+    @property
+    def id(self) -> int:
+        return self.message.id
+
+    @property
+    def guild(self) -> discord.Guild:
+        return self.channel.guild
+
+    @property
+    def info(self) -> str:
+        return self.title + ' @ ' + self.time
+
+    @property
+    def unix_time(self) -> int:
+        return int(self.time.strip('<t:>'))
+
+    @property
+    def jump_url(self) -> str:
+        return self.message.jump_url
+
+    def status(self, discord_id: int) -> str:
+        """
+        The user's status for this event, "NO" if they haven't signed up
+        """
+        status = self.view.roster.status(discord_id) if self.view is not None else None
+        return status or 'NO'
+
+    def cancel_tasks(self) -> None:
+        """
+        Stop the event's background tasks, e.g. once it has ended
+        """
+        if self.view is not None:
+            self.view.renderer.cancel()
+            self.view.stop()
+
+
+class EventRegistry:
+    """
+    The active events, by event (message) ID and by channel. There is at most one event per channel.
+    """
+
+    __slots__ = ('_events', '_channels')
+
+    def __init__(self):
+        # {event_id: Event}, in order of creation
+        self._events = {}
+        # {channel_id: event_id}
+        self._channels = {}
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __iter__(self) -> Iterator[Event]:
+        return iter(list(self._events.values()))
+
+    def add(self, event: Event) -> None:
+        if event.channel.id in self._channels:
+            raise ValueError(f'Channel {event.channel.id} already has an active event.')
+        self._events[event.id] = event
+        self._channels[event.channel.id] = event.id
+
+    def remove(self, event_id: int) -> Optional[Event]:
+        event = self._events.pop(event_id, None)
+        if event is not None:
+            del self._channels[event.channel.id]
+        return event
+
+    def get(self, event_id: int) -> Optional[Event]:
+        return self._events.get(event_id)
+
+    def in_channel(self, channel_id: int) -> Optional[Event]:
+        event_id = self._channels.get(channel_id)
+        return self._events[event_id] if event_id is not None else None
+
+    def in_guild(self, guild_id: int) -> list[Event]:
+        return [event for event in self._events.values() if event.guild.id == guild_id]
+
+
+events = EventRegistry()
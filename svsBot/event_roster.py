@@ -0,0 +1,119 @@
+from typing import Optional
+
+fieldPrefix = '>>> \u200b'  # quote block and whitespace char
+
+# each field value has a 1024 char limit, start a new field once a value passes this
+FIELD_VALUE_SOFT_LIMIT = 1000
+
+
+class EventRoster:
+    """
+    The attendees of the event: for each status, the users in the order they signed up, keyed by discord ID.
+    The name shown for each user is kept separately, so renaming someone doesn't move them.
+
+    Adding, removing, moving or renaming a user is O(1). The embed fields are rendered from the roster by
+    render_fields(), which only rebuilds the field strings of statuses that changed since the last render.
+    """
+
+    STATUSES = ('YES', 'MAYBE', 'NO')
+
+    __slots__ = ('_attendees', '_statuses', '_names', '_fields', '_dirty')
+
+    def __init__(self):
+        # {status: {discord_id: None}}, dicts keep insertion (sign-up) order
+        self._attendees = {status: {} for status in self.STATUSES}
+        # {discord_id: status}
+        self._statuses = {}
+        # {discord_id: name as rendered in the embed}
+        self._names = {}
+        # {status: [(field name, field value)]} from the last render
+        self._fields = {}
+        self._dirty = set(self.STATUSES)
+
+    def __len__(self) -> int:
+        return len(self._statuses)
+
+    def __contains__(self, discord_id: int) -> bool:
+        return discord_id in self._statuses
+
+    def status(self, discord_id: int) -> Optional[str]:
+        return self._statuses.get(discord_id)
+
+    def names(self, status: str) -> list[str]:
+        return [self._names[discord_id] for discord_id in self._attendees[status]]
+
+    def name(self, discord_id: int) -> Optional[str]:
+        return self._names.get(discord_id)
+
+    def count(self, status: str) -> int:
+        return len(self._attendees[status])
+
+    def set(self, discord_id: int, name: str, status: str) -> None:
+        """
+        Add the user to status, or move them there from their old status. Moving appends them to the end.
+        """
+        old_status = self._statuses.get(discord_id)
+        if old_status == status:
+            self.rename(discord_id, name)
+            return
+
+        if old_status is not None:
+            del self._attendees[old_status][discord_id]
+            self._dirty.add(old_status)
+
+        self._attendees[status][discord_id] = None
+        self._statuses[discord_id] = status
+        self._names[discord_id] = name
+        self._dirty.add(status)
+
+    def rename(self, discord_id: int, name: str) -> bool:
+        """
+        Change the name shown for the user, in place. Returns True if they are on the roster and the name changed.
+        """
+        status = self._statuses.get(discord_id)
+        if status is None or self._names[discord_id] == name:
+            return False
+
+        self._names[discord_id] = name
+        self._dirty.add(status)
+        return True
+
+    def remove(self, discord_id: int) -> None:
+        status = self._statuses.pop(discord_id, None)
+        if status is not None:
+            del self._attendees[status][discord_id]
+            del self._names[discord_id]
+            self._dirty.add(status)
+
+    def render_fields(self) -> list[tuple[str, str]]:
+        """
+        (name, value) of every embed field, in order.
+
+        Each status gets a title field "STATUS  [count]" and as many untitled continuation fields as needed to keep
+        each value under FIELD_VALUE_SOFT_LIMIT chars. A status with no attendees still gets its (empty) title field.
+        """
+        for status in self._dirty:
+            self._fields[status] = self._render_status(status)
+        self._dirty.clear()
+
+        return [field for status in self.STATUSES for field in self._fields[status]]
+
+    def _render_status(self, status: str) -> list[tuple[str, str]]:
+        names = self.names(status)
+
+        fieldVals = []
+        lines = []
+        length = len(fieldPrefix)
+        for name in names:
+            lines.append(name)
+            length += len(name) + 1
+            if length > FIELD_VALUE_SOFT_LIMIT:
+                fieldVals.append(fieldPrefix + '\n'.join(lines) + '\n')
+                lines = []
+                length = len(fieldPrefix)
+
+        if lines or not fieldVals:
+            fieldVals.append(fieldPrefix + ''.join(name + '\n' for name in lines))
+
+        titles = [f'{status}  [{len(names)}]'] + ['\u200b'] * (len(fieldVals) - 1)
+        return list(zip(titles, fieldVals))
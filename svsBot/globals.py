@@ -1,10 +1,5 @@
 mainChannels = None   # can't figure out how to access this from My_Help() without making it a global
 
-# stores event information - these are pretty hard to get rid of as they are referenced far away from the bot.
-eventInfo = ''
-eventMessage = None
-eventChannel = None
-
 # only used to remove my private server from the bot's bot.guilds attr
 EVAN_GUILD_ID = 964624340295499857    # svsBotTestServer
 
@@ -20,12 +15,48 @@ USER_DATABASE_NAME = 'userHistory.db'
 # name of event info database
 EVENT_DATABASE_NAME = 'eventInfo.db'
 
+# number of long-lived connections kept open to the user info database
+DB_POOL_SIZE = 3
+
+# SQLite tuning for the pooled connections: page cache per connection (KiB), memory-mapped I/O (bytes),
+# and number of prepared statements cached per connection
+DB_CACHE_SIZE_KB = 8192
+DB_MMAP_SIZE_BYTES = 64 * 1024 * 1024
+DB_CACHED_STATEMENTS = 64
+
+# button clicks are written to the database in batches: at most every WRITE_BEHIND_INTERVAL_SECONDS, or as soon as
+# WRITE_BEHIND_MAX_PENDING users have unwritten clicks
+WRITE_BEHIND_INTERVAL_SECONDS = 0.25
+WRITE_BEHIND_MAX_PENDING = 200
+
+# maximum number of users' database entries kept in memory
+ENTRY_CACHE_SIZE = 2048
+
+# number of DMs the bot sends at the same time
+DM_QUEUE_WORKERS = 4
+
+# bulk DMs (reminders) are queued this many at a time. Progress is saved after each batch, so a reminder interrupted by
+# a restart resumes from there
+DM_FAN_OUT_BATCH_SIZE = 50
+
+# users whose DMs are closed are not DMed again for this many seconds
+DM_CLOSED_CACHE_SECONDS = 60 * 60
+
 # name of user info database dump file
 USER_DATABASE_DUMP_NAME = 'svs_userHistory_dump.sql'
 
 # name of profession configuration json file
 PROFESSION_INFO_JSON = 'profession_info.json'
 
+# how often (seconds) to check PROFESSION_INFO_JSON for changes and reload it. Set to 0 to only reload with
+# the reload_config command
+PROFESSION_CONFIG_POLL_SECONDS = 30
+
+# Whether discord.py loads every member of every guild when the bot connects. With several large guilds that takes a
+# while and a lot of memory. If False, members are fetched when a report, reminder or restored event needs them (see
+# member_cache.py) and kept from then on; name changes are only picked up for members fetched or seen since startup
+CHUNK_GUILDS_AT_STARTUP = True
+
 # central guild "1508". All other guilds are subsets of this guild; it will be used for pulling member's
 # display_name attribute for making the CSV. 
 GUILD_ID_1508 = 915761804704104489
@@ -57,10 +88,10 @@ COMMAND_PREFIX = '~'
 # Set this to '', "", or None to not send a thumbnail with the embeds
 LOGO_URL = r'https://raw.githubusercontent.com/evanm1455/svsInvitationBot/master/logo1.png'
 
-# name of the csv file containing attendee information
+# filename of the csv of attendee information, as attached to the bot's message
 CSV_FILENAME = r'svs_entries.csv'
 
-# name of the csv file containing users that interacted with event
+# filename of the csv of users that interacted with event, as attached to the bot's message
 YMN_CSV_FILENAME = r'ymn.csv'
 
 # number of people to select as lottery winners. This should be higher than the intended number of winners, to account
@@ -70,6 +101,20 @@ NUMBER_OF_LOTTO_WINNERS = 40
 # how many hours before the scheduled event time should "Maybe's" be reminded of the event
 CONFIRM_MAYBE_WARNING_HOURS = 40
 
+# reminders DMed before each event, as (hours before the event, audience). Audiences:
+#   'MAYBE'           signed up as MAYBE
+#   'UNCONFIRMED'     signed up as YES, but haven't used the confirm command since
+#   'NOT_INTERACTED'  registered in the database and in the event's server, but haven't clicked the event
+# A stage is skipped if the event is created (or moved) less than its hours before the event time.
+REMINDER_STAGES = [
+    (CONFIRM_MAYBE_WARNING_HOURS, 'MAYBE'),
+    (3, 'UNCONFIRMED'),
+]
+
+# The event message is edited at most once every EVENT_RENDER_INTERVAL_SECONDS, with all sign-ups since the last edit.
+# Discord rate limits message edits, so keep this at 1 or above.
+EVENT_RENDER_INTERVAL_SECONDS = 1.0
+
 # Names longer than this in the event embed will be truncated.
 # Maximum of 23
 MAX_NAME_LENGTH_IN_EMBED_FIELD = 8
@@ -1,17 +1,39 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 import datetime
 import time
 import random
 import csv
+import io
 from asyncio import TimeoutError
-from typing import Union
+from typing import Union, Optional
 import asyncio
-from json import load
 
-from . import db, globals
+import logging
+
+from . import db, globals, profession_config, dm_queue, member_cache
+from . event_registry import Event, events
+from . job_scheduler import Job, jobs
 from . profession_interaction import ProfessionMenuView
 
+# job kind of the reminder stages, see schedule_reminders()
+REMINDER = 'reminder'
+
+# {audience: (who they are, for the admin's report, reminder text)}, see globals.REMINDER_STAGES.
+# The text is formatted with the event's info and jump_url
+REMINDER_AUDIENCES = {
+    'MAYBE': ('**MAYBE** users',
+              'You are registered as **MAYBE** for {info}\n'
+              'If you would like to change your status, go to [Event Message]({url})'),
+    'UNCONFIRMED': ('unconfirmed **YES** users',
+                    'You are registered as **YES** for {info}\n'
+                    f'Reply {globals.COMMAND_PREFIX}confirm to confirm that you will attend, or change your status at '
+                    '[Event Message]({url})'),
+    'NOT_INTERACTED': ('users that have not signed up',
+                       'Sign-ups are open for {info}\n'
+                       'If you would like to attend, go to [Event Message]({url})'),
+}
+
 nameInd, classInd, levelInd, unitInd, marchInd, allianceInd, trapsInd, skinsInd = range(8)
 
 
@@ -74,8 +96,8 @@ def build_event_embed(title, descr, cmd_list, old_embed=None):
 
     # if reusing the old event's description, must avoid adding the firstTimeHint twice
     if 'If this is your first time interacting' not in descr:
-        firstTimeHint = '\n\nIf this is your first time interacting with the bot, you will see "This interaction ' \
-                        'failed." The bot will send you a DM with instructions.\n\u200b'
+        firstTimeHint = '\n\nIf this is your first time interacting with the bot, it will send you a DM with ' \
+                        'instructions.\n\u200b'
         descr += firstTimeHint
 
     embed = discord.Embed(title=title, description=descr, color=discord.Color.dark_red())
@@ -102,57 +124,75 @@ def build_event_embed(title, descr, cmd_list, old_embed=None):
 
 
 # TODO: test this
-async def start_confirm_maybe_loop(time_until_event: float,
-                                   event_guild: discord.Guild) -> Union[asyncio.Task, None]:
+async def schedule_reminders(event: Event, admin: Union[discord.Member, discord.User]) -> None:
     """
-        When it is X hours before the event, remind "MAYBE" users that they are registered as Maybe.
-        X = globals.confirmMaybeWarningTimeHours
+    (Re)schedule the reminder stages of the event, globals.REMINDER_STAGES, from its time. Replaces the pending ones.
+    Stages that would already be due are left out.
+    admin is sent the delivery report of each stage.
     """
+    stages = []
+    for hours, audience in globals.REMINDER_STAGES:
+        if audience not in REMINDER_AUDIENCES:
+            logging.error(f'Unknown reminder audience "{audience}" in REMINDER_STAGES, skipping it.')
+            continue
+        due = event.unix_time - hours * 60 * 60
+        if due > time.time():
+            stages.append((due, {'audience': audience, 'admin': admin.id}))
+
+    await jobs.replace(event.id, REMINDER, stages)
 
-    # get the time until the reminder should happen
-    time_until_reminder = time_until_event - globals.CONFIRM_MAYBE_WARNING_HOURS * 60 * 60
 
-    # "maybes" will only be reminded if it would be at least 2 days in the future
-    if time_until_reminder < 2 * 24 * 60 * 60:
+async def send_reminders(job: Job) -> None:
+    """
+    Job handler: DM a reminder stage's audience, then report the counts to the admin.
+    Progress is saved in the job's payload, so after a restart it continues with the users it hadn't reached.
+    """
+    event = events.get(job.event_id)
+    if event is None or event.unix_time <= time.time():
+        # ended, or the bot was down until after the event
         return
 
-    async def send_reminders() -> None:
-        # send a reminder embed to all users that are signed up to the event as "MAYBE"
+    payload = job.payload
+    audience = payload['audience']
+    who, text = REMINDER_AUDIENCES[audience]
 
-        # build embed
-        title = 'Event Reminder'
-        descr = f'You are registered as **MAYBE** for {globals.eventInfo}\n' \
-                f'If you would like to change your status, go to [Event Message]({globals.eventMessage.jump_url})'
-        embed = discord.Embed(title=title, description=descr)
+    # build embed
+    title = 'Event Reminder'
+    descr = text.format(info=event.info, url=event.jump_url)
+    embed = discord.Embed(title=title, description=descr)
 
-        # send embed to all maybes
-        maybeEntries = await db.all_of_category('status', 'MAYBE')
-        for entry in maybeEntries:
-            user = event_guild.get_member(entry[0])
-            await user.send(embed=embed)
+    # the whole audience in one query, in ID order, past the ones already reminded
+    audienceIDs = await db.get_audience_ids(event.id, audience, after=payload.get('after', 0))
+    members = await member_cache.resolve(event.guild, audienceIDs)
+    recipients = [(discord_id, members.get(discord_id)) for discord_id in audienceIDs]
+    if audience == 'NOT_INTERACTED':
+        # every registered user; only those in the event's server are its audience
+        recipients = [recipient for recipient in recipients if recipient[1] is not None]
 
-    # loop to schedule the reminder for the future
-    @tasks.loop(seconds=time_until_reminder, count=2)
-    async def confirm_maybe_loop():
-        # the loop immediately runs once upon start, so must loop twice, wait until second loop to send reminder
-        if confirm_maybe_loop.current_loop > 0:
-            await send_reminders()
+    async def save_progress(last_id: int, counts: dict) -> None:
+        payload['after'] = last_id
+        payload['counts'] = counts
+        await jobs.save(job)
 
-    # print(type(confirm_maybe_loop))
-    # print(dir(confirm_maybe_loop))
-    # start the loop
-    maybe_loop = confirm_maybe_loop.start()
-    # print(type(maybe_loop))
-    # print(dir(maybe_loop))
-    return maybe_loop
+    counts = await dm_queue.fan_out(recipients, payload.get('counts'), save_progress, embed=embed)
 
-    # return confirm_maybe_loop
+    report = f'Delivered: {counts["delivered"]}\n' \
+             f'Failed: {counts["failed"]}\n' \
+             f'Skipped: {counts["skipped"]} (DMs closed, or not in the server)'
+    logging.info(f'Sent "{audience}" reminders for {event.info}. {report}'.replace('\n', ', '))
 
+    admin = await member_cache.get(event.guild, payload['admin']) if 'admin' in payload else None
+    if admin is not None:
+        embed = discord.Embed(title='Reminders Sent', description=f'Reminded the {who} of {event.info}\n\n{report}')
+        dm_queue.enqueue(admin, embed=embed)
 
-async def request_entry(user: Union[discord.Member, discord.User], event_attempt=False) -> None:
+
+async def request_entry(user: Union[discord.Member, discord.User], event_attempt=False) -> bool:
     """
     Prompt unregistered user to provide data entry for SQL database.
     Called when user reacts to an event or uses DM command $lotto or $info before being added to DB
+
+    Returns False if the user could not be DMed.
     """
 
     if event_attempt:
@@ -162,40 +202,27 @@ async def request_entry(user: Union[discord.Member, discord.User], event_attempt
         cont = "You do not have an existing entry in the database. Please enter information.\n"
     cont += "Menu will disappear in 5 minutes."
 
-    msg = await user.send(content=cont)
+    msg = await dm_queue.enqueue(user, dm_queue.CONFIRMATION, content=cont)
+    if msg is None:
+        return False
     # DB will be updated following user interaction with ProfessionMenu
     view = ProfessionMenuView(msg, 'class', first_entry=True)
     await msg.edit(view=view)
+    return True
 
 
-async def delete_event(user, bot, intent: str) -> None:
+async def delete_event(user, bot, event: Event, intent: str) -> None:
     """
-    Ends the active event and handles cleanup.
+    Ends an active event and handles cleanup.
     Called by "close" and "delete" commands.
 
     STEPS:
     Check for confirmation with invoking user. If yes:
-    Set eventInfo.db to default value
-    Set everyone's status to "NO"
+    Remove the event from the registry and mark it as ended in eventInfo.db
     Remove interaction buttons from event message
     If intent = 'make_csv', build a CSV of attending users and DM it to invoking user
     """
 
-    try:
-        _ = globals.eventMessage.content
-    except AttributeError:
-        # this should only happen if the event message was manually deleted. In that case, need to escape
-        # out of the function early, or all of the below code will error. Reset event vars.
-
-        bot.reset_event_vars()
-        await db.update_event('placeholder', 'placeholder', 0, 0)
-        # reset everyone's event data (status, interaction flag)
-        await db.reset_user_event_data()
-        resp = 'Event Message not found. This indicates the event message was manually deleted. ' \
-               'Event variables should now be reset.'
-        await user.send(resp)
-        return
-
     # prompt the user to send "confirm" in DM to confirm their command
     timeout = 60
     prompt = ''
@@ -204,11 +231,14 @@ async def delete_event(user, bot, intent: str) -> None:
     elif intent == 'make_csv':
         prompt += f'Type "confirm" within {timeout} seconds ' \
                   f'to confirm you want to close signups and receive a CSV of attendees.\n' \
-                  f'Doing this is non-reversible, as it will reset everyone\'s status to \"NO\".'
+                  f'Doing this is non-reversible, as it will end sign-ups for {event.info}.'
 
     cmd = globals.COMMAND_PREFIX + ('delete' if intent == 'delete' else 'close')
     embed = discord.Embed(title=f'{cmd}', description=prompt)
-    prompt = await user.send(embed=embed)
+    prompt = await dm_queue.enqueue(user, dm_queue.CONFIRMATION, embed=embed)
+    if prompt is None:
+        raise commands.CheckFailure('Could not DM you the confirmation prompt. Allow direct messages from server '
+                                    'members and try again.')
 
     # wait for a response from the user
     try:
@@ -223,13 +253,22 @@ async def delete_event(user, bot, intent: str) -> None:
 
     # check if reply was not "confirm"
     if reply.content.lower() != 'confirm':
-        edit = f'[Event Message]({globals.eventMessage.jump_url})'
+        edit = f'[Event Message]({event.jump_url})'
         embed = discord.Embed(title=f'{cmd} Failure', description=edit)
         await prompt.edit(embed=embed)
         return
 
+    # the event may have been ended by someone else while waiting for the reply
+    if events.get(event.id) is not event:
+        embed = discord.Embed(title=f'{cmd} Failure', description=f'{event.info} has already ended.')
+        await prompt.edit(embed=embed)
+        return
+
     # reply was "confirm"
     else:
+        # make sure every click so far is in the database before building CSVs / resetting statuses
+        await db.flush_pending_writes()
+
         title = f'{cmd} Success'
         if intent == 'make_csv':
             eventMessageEdit = '```Sign-ups for this event are closed.```'
@@ -238,40 +277,49 @@ async def delete_event(user, bot, intent: str) -> None:
             central_guild = bot.get_guild(globals.GUILD_ID_1508)
             if central_guild is None:
                 raise commands.CheckFailure('Failed to acquire 1508 guild.')
-            csvFile = await build_csv(central_guild, status='ATTENDING', finalize=True)
-            ymn_csvFile = await build_ymn_csv(central_guild)
-            description = f'Successfully closed event: {globals.eventInfo}\n' \
+            csvFile = await build_csv(central_guild, status='ATTENDING', finalize=True, event_id=event.id)
+            ymn_csvFile = await build_ymn_csv(central_guild, event.id)
+            description = f'Successfully closed event: {event.info}\n' \
                           f'CSV of all users that responded "YES" or "MAYBE": {globals.CSV_FILENAME}\n' \
                           f'CSV of all users that interacted with the event: {globals.YMN_CSV_FILENAME}\n' \
-                          f'[Event Message]({globals.eventMessage.jump_url})'
+                          f'[Event Message]({event.jump_url})'
 
             # send a backup of the database to dedicated backup channel
             backupChannel = bot.get_channel(globals.DB_BACKUP_CHANNEL_ID)
+            await db.checkpoint()
             dbFile = discord.File(globals.USER_DATABASE_NAME)
             await backupChannel.send(file=dbFile)
         else:
             # intent = 'delete'
             eventMessageEdit = f'```This event was cancelled with {globals.COMMAND_PREFIX}delete.```'
-            description = f'Deleted {globals.eventInfo}\n' \
-                          f'[Event Message]({globals.eventMessage.jump_url})'
+            description = f'Deleted {event.info}\n' \
+                          f'[Event Message]({event.jump_url})'
             csvFile = ymn_csvFile = None
 
-    # remove the EventButtons view, put some text above the event embed indicating it's closed / deleted
-    await globals.eventMessage.edit(content=eventMessageEdit, view=None)
+    # no more clicks or reminders for this event
+    events.remove(event.id)
+
+    try:
+        # show the last sign-ups on the embed before it is frozen
+        await event.view.renderer.close()
+        # remove the EventButtons view, put some text above the event embed indicating it's closed / deleted
+        await event.message.edit(content=eventMessageEdit, view=None)
+    except discord.NotFound:
+        # the event message was manually deleted. Finish the cleanup anyways
+        logging.error(f'Event message of {event.info} was not found, it was probably deleted manually.')
+    event.cancel_tasks()
+    await jobs.cancel_event(event.id)
+
     embed = discord.Embed(title=title, description=description)
 
     # if csvFile is not None, attach it to the message edit
     kwargs = {'embed': embed, 'attachments': [csvFile, ymn_csvFile]} if (csvFile and ymn_csvFile) else {'embed': embed}
     await prompt.edit(**kwargs)
 
-    # reset event-related variables and confirm maybe loop
-    bot.reset_event_vars()
+    logging.info(f'Entry cache stats at end of event: {db.entry_cache.stats()}')
 
-    # reset event database
-    await db.update_event('placeholder', 'placeholder', 0, 0)
-    # reset everyone's event data (status, interaction flag)
-    await db.reset_user_event_data()
-    # reset everyone's "interacted_with_event" flag to "0"
+    # mark the event as ended in the event database. Its sign-ups stay as they are
+    await db.close_event(event.id, 'CLOSED' if intent == 'make_csv' else 'CANCELLED')
 
 
 def parse_entry(entry_: tuple, cls: str) -> tuple:
@@ -279,9 +327,10 @@ def parse_entry(entry_: tuple, cls: str) -> tuple:
     Convert data to human-readable text for CSV display
         Replace commas with spaces, acronymize units/traps
     """
-    unitAbbrevDict = db.get_profession_abbreviation_dict('units')
+    config = profession_config.get()
+    unitAbbrevDict = config.category('units').long_to_short
     units = entry_[unitInd]
-    units = [unitAbbrevDict[unit] for unit in units.split(', ')]
+    units = [unitAbbrevDict.get(unit, unit) for unit in units.split(', ')]
     units = ''.join(units)
     skins = entry_[skinsInd].replace(', ', ' ')
 
@@ -295,9 +344,9 @@ def parse_entry(entry_: tuple, cls: str) -> tuple:
         )
     else:
         # for MM, put the traps entry at the end to align with CE entries in same col
-        mmTrapsAbbrevDict = db.get_profession_abbreviation_dict('mm_traps')
+        mmTrapsAbbrevDict = config.category('mm_traps').long_to_short
         traps = entry_[trapsInd]
-        traps = [mmTrapsAbbrevDict[trap] for trap in traps.split(', ')]
+        traps = [mmTrapsAbbrevDict.get(trap, trap) for trap in traps.split(', ')]
         traps = ' '.join(traps)
         newEntry = (
             *entry_[:unitInd],
@@ -310,14 +359,19 @@ def parse_entry(entry_: tuple, cls: str) -> tuple:
     return tuple(newEntry)
 
 
+def ascending_rank(dat: profession_config.ProfessionCategory, value) -> int:
+    """
+    dat.rank(value) for ascending sorts: values that are no longer options sort after every option
+    """
+    rank = dat.rank(value)
+    return rank if rank >= 0 else len(dat.options)
+
+
 def sort_by_profession_category(entries, category: str, reverse=False) -> list:
     # don't sort an empty list
     if not entries:
         return entries
 
-    with open(globals.PROFESSION_INFO_JSON, 'r') as f:
-        obj = load(f)
-
     # This will be removed once I move entry to a class defn
     category_to_index_map = {
         'class':      db.CLASS_IND,
@@ -329,90 +383,61 @@ def sort_by_profession_category(entries, category: str, reverse=False) -> list:
         'skins':      db.SKINS_IND
     }
     category_ind = category_to_index_map[category]
-    if category == 'level':
-        category = 'ce_level' if entries[0][db.CLASS_IND] == 'CE' else 'mm_level'
-    dat = obj[category]
-    options = dat['options']
+    class_ = entries[0][db.CLASS_IND] if category == 'level' else None
+    dat = profession_config.get().category(category, class_)
 
-    entries = sorted(entries, key=lambda x: options.index(x[category_ind]), reverse=reverse)
+    # values that are no longer options go last either way
+    rank = dat.rank if reverse else lambda value: ascending_rank(dat, value)
+    entries = sorted(entries, key=lambda x: rank(x[category_ind]), reverse=reverse)
     return entries
 
 
-async def get_sorted_entries(guild: discord.Guild, status: str):
-    """
-    Get entries from database and sort them
+def get_sorted_entries(partitions: dict, status: str):
     """
-    ce = await db.all_of_category('class', 'CE', guild=guild, status=status, display_name=True)
-    mm = await db.all_of_category('class', 'MM', guild=guild, status=status, display_name=True)
+    Sort the entries from db.partition_by_status_and_class()
 
-    sorted_maybe_ce, sorted_maybe_mm, sorted_maybe = [], [], []
+    Each entry is put in its bucket (multi-unit or one of the single units, per class) in one pass, then each
+    bucket is sorted once. The order by level, march size and alliance comes from the database (db.SORT_RANK_IND).
+    """
+    config = profession_config.get()
+    alliances = config.category('alliance')
+    units = config.category('units')
+
+    # unit bitmask (db.UNIT_MASK_IND) -> column of the single-unit entries, within a class
+    unitColumns = {1 << units.rank(unit): col for col, unit in enumerate(['Army', 'Air Force', 'Navy'])}
+
+    # [CE, MM] entries with more than one unit type, and the ones whose only unit has no column (e.g. it was removed
+    # from the config), so that nobody is left out
+    multiUnitArrays = [[], []]
+    # single-unit entries of each class, one array for each unit type: [CE A, CE F, CE N, MM A, MM F, MM N]
+    unitArrays = [[] for _ in range(2 * len(unitColumns))]
+    for classCol, class_ in enumerate(['CE', 'MM']):
+        for entry in partitions[status][class_]:
+            mask = entry[db.UNIT_MASK_IND]
+            # units that are no longer options have no bit, so the text tells whether there is more than one
+            if mask in unitColumns and ', ' not in entry[unitInd]:
+                unitArrays[classCol * len(unitColumns) + unitColumns[mask]].append(entry)
+            else:
+                multiUnitArrays[classCol].append(entry)
+
+    # single units: by level, then by march size (both descending), then by alliance
+    def single_unit_key(x):
+        return x[db.SORT_RANK_IND]
+
+    # multi units: by number of units (descending) first
+    def multi_unit_key(x):
+        return -(x[unitInd].count(', ') + 1), x[db.SORT_RANK_IND]
+
+    for subArray in multiUnitArrays:
+        subArray.sort(key=multi_unit_key)
+    for subArray in unitArrays:
+        subArray.sort(key=single_unit_key)
+
+    # finally, sort the maybes by alliance, class (CE first), level
+    sorted_maybe = []
     if status == 'YES':
-        # sorted_maybe = await db.all_of_category('class', 'CE', guild=guild, status='MAYBE', display_name=True)
-        # sorted_maybe += await db.all_of_category('class', 'MM', guild=guild, status='MAYBE', display_name=True)
-        sorted_maybe_ce = await db.all_of_category('class', 'CE', guild=guild, status='MAYBE', display_name=True)
-        sorted_maybe_mm = await db.all_of_category('class', 'MM', guild=guild, status='MAYBE', display_name=True)
-
-    # def sort_march(entry):
-    #     msize = entry[marchInd]
-    #     # msize takes the forms {< 160, 160-169, ... , 210-219, 220+}
-    #     if '-' not in msize:
-    #         # strip the special chars
-    #         msize = int(msize.strip('><+ '))
-    #     else:
-    #         # take the bottom of the range and add 5 to represent median and avoid equality with smallest edge case
-    #         msize = int(msize.split('-')[0]) + 5
-    #     return msize
-
-    # def sort_alliance(entry) -> int:
-    #     allianceDict = {'508N': 0, '508W': 1, '508S': 2, '508E': 3}
-    #     alliance = entry[allianceInd]
-    #     return allianceDict[alliance]
-
-    # entries with more than one unit type
-    multiUnitArrays = [
-        filter(lambda x: len(x[unitInd].split(', ')) > 1, ce),
-        filter(lambda x: len(x[unitInd].split(', ')) > 1, mm)
-    ]
-
-    # split the single-unit entries of each class into 3 arrays, one for each unit type
-    unitArrays = [
-        filter(lambda x: x[unitInd] == 'Army', ce),
-        filter(lambda x: x[unitInd] == 'Air Force', ce),
-        filter(lambda x: x[unitInd] == 'Navy', ce),
-        filter(lambda x: x[unitInd] == 'Army', mm),
-        filter(lambda x: x[unitInd] == 'Air Force', mm),
-        filter(lambda x: x[unitInd] == 'Navy', mm)
-    ]
-
-    # sort each array in multiUnitArrays by number of units, then by level, then by march size, then by alliance
-    # must sort in reverse order
-    # multiUnitArrays = [sorted(subArray, key=sort_alliance) for subArray in multiUnitArrays]
-    # multiUnitArrays = [sorted(subArray, key=sort_march, reverse=True) for subArray in multiUnitArrays]
-    # multiUnitArrays = [sorted(subArray, key=lambda x: x[levelInd], reverse=True) for subArray in multiUnitArrays]
-    # multiUnitArrays = [sorted(subArray, key=lambda x: len(x[unitInd]), reverse=True) for subArray in multiUnitArrays]
-    multiUnitArrays = [sort_by_profession_category(subArray, 'alliance') for subArray in multiUnitArrays]
-    multiUnitArrays = [sort_by_profession_category(subArray, 'march_size', reverse=True) for subArray in multiUnitArrays]
-    multiUnitArrays = [sort_by_profession_category(subArray, 'level', reverse=True) for subArray in multiUnitArrays]
-    multiUnitArrays = [sorted(subArray, key=lambda x: len(x[unitInd].split(', ')), reverse=True) for subArray in multiUnitArrays]
-
-    # sort the unit arrays by level, then by march size, then by alliance
-    # unitArrays = [sorted(subArray, key=sort_alliance) for subArray in unitArrays]
-    # unitArrays = [sorted(subArray, key=sort_march, reverse=True) for subArray in unitArrays]
-    # unitArrays = [sorted(subArray, key=lambda x: x[levelInd], reverse=True) for subArray in unitArrays]
-    unitArrays = [sort_by_profession_category(subArray, 'alliance') for subArray in unitArrays]
-    unitArrays = [sort_by_profession_category(subArray, 'march_size', reverse=True) for subArray in unitArrays]
-    unitArrays = [sort_by_profession_category(subArray, 'level', reverse=True) for subArray in unitArrays]
-
-    # finally, sort the maybes by alliance, class, level
-    # if sorted_maybe:
-    #     sorted_maybe = sorted(sorted_maybe, key=lambda x: x[levelInd], reverse=True)
-    #     sorted_maybe = sorted(sorted_maybe, key=lambda x: x[classInd])
-    #     sorted_maybe = sorted(sorted_maybe, key=sort_alliance)
-    if sorted_maybe_ce + sorted_maybe_mm:
-        sorted_maybe_ce = sort_by_profession_category(sorted_maybe_ce, 'level', reverse=True)
-        sorted_maybe_mm = sort_by_profession_category(sorted_maybe_mm, 'level', reverse=True)
-        sorted_maybe = sorted_maybe_ce + sorted_maybe_mm
-        sorted_maybe = sort_by_profession_category(sorted_maybe, 'alliance')
+        sorted_maybe = partitions['MAYBE']['CE'] + partitions['MAYBE']['MM']
+        sorted_maybe.sort(key=lambda x: (ascending_rank(alliances, x[allianceInd]), x[classInd] != 'CE', -x[db.LEVEL_RANK_IND]))
 
     # fxn to convert the big arrays
     def convert_array(array: list):
@@ -483,22 +508,19 @@ def format_sorted_entries(multiUnitArrays, unitArrays):
     return combinedMultiArray, combined_ceSingles, combined_mmSingles
 
 
-async def get_unsorted_entries(guild: discord.Guild, status: str):
+def get_unsorted_entries(partitions: dict, status: str):
     """
-    Get the entries from database with minimal sorting
+    Get the entries from db.partition_by_status_and_class() with minimal sorting
     """
     unsorted_no = []
     unsorted_all = []
 
     # get the yes and maybe attendees
-    unsorted_yes = await db.all_of_category('class', 'CE', guild=guild, status='YES', display_name=True)
-    unsorted_yes += await db.all_of_category('class', 'MM', guild=guild, status='YES', display_name=True)
-    unsorted_maybe = await db.all_of_category('class', 'CE', guild=guild, status='MAYBE', display_name=True)
-    unsorted_maybe += await db.all_of_category('class', 'MM', guild=guild, status='MAYBE', display_name=True)
+    unsorted_yes = partitions['YES']['CE'] + partitions['YES']['MM']
+    unsorted_maybe = partitions['MAYBE']['CE'] + partitions['MAYBE']['MM']
     if status == 'ALL':
         # if called with "all", also get the no's to complete the set
-        unsorted_no = await db.all_of_category('class', 'CE', guild=guild, status='NO', display_name=True)
-        unsorted_no += await db.all_of_category('class', 'MM', guild=guild, status='NO', display_name=True)
+        unsorted_no = partitions['NO']['CE'] + partitions['NO']['MM']
 
     if status == 'YES':
         # if "attending" -> status = "YES", then just work with YES/MAYBE entries
@@ -523,7 +545,8 @@ async def get_unsorted_entries(guild: discord.Guild, status: str):
 
 
 # noinspection PyShadowingNames
-async def build_csv(guild: discord.Guild, status: str = 'ALL', finalize=False) -> discord.File:
+async def build_csv(guild: discord.Guild, status: str = 'ALL', finalize=False,
+                    event_id: Optional[int] = None) -> discord.File:
     """
     Parses the user database into CSV subcategories.
     Outputs a formatted, sorted CSV, with unsorted rows at the bottom.
@@ -534,6 +557,7 @@ async def build_csv(guild: discord.Guild, status: str = 'ALL', finalize=False) -
                     ATTENDING to get all users who have indicated YES or MAYBE
         finalize:   Indicate that the event has been closed. Only True if called through ~close
                     Triggers lottery
+        event_id:   the event whose statuses to use. Without one, everyone is "NO"
 
     get_csv attending:
         SORTED YES
@@ -550,19 +574,35 @@ async def build_csv(guild: discord.Guild, status: str = 'ALL', finalize=False) -
     if status == 'ATTENDING':
         status = 'YES'
 
+    # one query for every row in the report, with display names resolved once per row
+    statuses = ['YES', 'MAYBE'] if status == 'YES' else ['YES', 'MAYBE', 'NO']
+    entries = await db.get_report_entries(guild, event_id, statuses=statuses)
+
+    # sorting and writing a large report takes a while; keep the event loop free to handle clicks meanwhile
+    csvBuffer = await asyncio.to_thread(write_csv, entries, status, finalize)
+    return discord.File(csvBuffer, filename=globals.CSV_FILENAME)
+
+
+def write_csv(entries: list, status: str, finalize: bool) -> io.BytesIO:
+    """
+    Renders the CSV for build_csv() into an in-memory file. Runs in a worker thread.
+    """
+    partitions = db.partition_by_status_and_class(entries)
+
     if finalize:
         # select lotto winners
-        lottoEntries = await db.all_of_category('lotto', 1, guild=guild, display_name=True)
+        lottoEntries = [(entry[nameInd],) for entry in entries
+                        if entry[db.STATUS_IND] == 'YES' and entry[db.LOTTERY_IND] == 1]
         random.shuffle(lottoEntries)
         lottoWinners = lottoEntries[:globals.NUMBER_OF_LOTTO_WINNERS]
 
-    multiUnitArrays, unitArrays, sorted_maybe = await get_sorted_entries(guild, status)
+    multiUnitArrays, unitArrays, sorted_maybe = get_sorted_entries(partitions, status)
     combinedMultiArray, combined_ceSingles, combined_mmSingles = format_sorted_entries(multiUnitArrays, unitArrays)
-    unsorted_yes, unsorted_maybe, unsorted_all = await get_unsorted_entries(guild, status)
+    unsorted_yes, unsorted_maybe, unsorted_all = get_unsorted_entries(partitions, status)
 
     # multi-unit should be separate from the rest, just write those in one column
     # single-unit should be one column for each unit type, grouped within column by class, ordered by level
-    with open(globals.CSV_FILENAME, 'w', newline='', encoding='utf-8') as csvfile:
+    with io.StringIO(newline='') as csvfile:
         writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
 
         ceColTitles = ['Name', 'Class', 'Level', 'Units', 'March Size', 'Alliance', 'Skins']
@@ -636,11 +676,12 @@ async def build_csv(guild: discord.Guild, status: str = 'ALL', finalize=False) -
             writer.writerow(mmColTitles)
             writer.writerows(unsorted_maybe)
 
-    eventCSV = discord.File(globals.CSV_FILENAME)
-    return eventCSV
+        csvBuffer = io.BytesIO(csvfile.getvalue().encode('utf-8'))
 
+    return csvBuffer
 
-async def build_ymn_csv(guild: discord.Guild) -> discord.File:
+
+async def build_ymn_csv(guild: discord.Guild, event_id: int) -> discord.File:
     """
     Creates a CSV containing users that have interacted with the CSV.
 
@@ -648,7 +689,17 @@ async def build_ymn_csv(guild: discord.Guild) -> discord.File:
     Separated by alliance, sorted alphabetically.
     """
 
-    interactions = await db.all_of_category('interacted_with_event', 1, guild, display_name=True)
+    entries = await db.get_report_entries(guild, event_id, interacted_only=True)
+    csvBuffer = await asyncio.to_thread(write_ymn_csv, entries)
+    return discord.File(csvBuffer, filename=globals.YMN_CSV_FILENAME)
+
+
+def write_ymn_csv(entries: list) -> io.BytesIO:
+    """
+    Renders the CSV for build_ymn_csv() into an in-memory file. Runs in a worker thread.
+    """
+    # the display name takes the place of the discord ID
+    interactions = [(entry[db.ID_IND], entry[db.STATUS_IND], entry[db.ALLIANCE_IND]) for entry in entries]
     nameInd, statusInd, allianceInd = range(3)
     alliances = ['508N', '508W', '508S', '508E']
     colTitles = ['Name', 'Status']
@@ -678,7 +729,7 @@ async def build_ymn_csv(guild: discord.Guild) -> discord.File:
         entry = a + tSpacer + b + tSpacer + c + tSpacer + d
         combinedEntries.append(entry)
 
-    with open(globals.YMN_CSV_FILENAME, 'w', newline='', encoding='utf-8') as csvfile:
+    with io.StringIO(newline='') as csvfile:
         writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
 
         lSpacer = ['']
@@ -688,5 +739,6 @@ async def build_ymn_csv(guild: discord.Guild) -> discord.File:
         writer.writerow(colTitles + lSpacer + colTitles + lSpacer + colTitles + lSpacer + colTitles)
         writer.writerows(combinedEntries)
 
-    ymnCSV = discord.File(globals.YMN_CSV_FILENAME)
-    return ymnCSV
+        csvBuffer = io.BytesIO(csvfile.getvalue().encode('utf-8'))
+
+    return csvBuffer
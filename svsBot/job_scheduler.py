@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import json
+import time
+from typing import Awaitable, Callable, Optional
+
+import logging
+
+from . import db
+
+# the timer wakes up at least this often (seconds), so a change of the system clock delays a job by at most this much
+MAX_SLEEP_SECONDS = 60 * 60
+
+
+class Job:
+    """
+    A pending job: run the handler registered for `kind` at unix time `due`.
+    """
+
+    __slots__ = ('id', 'kind', 'event_id', 'due', 'payload')
+
+    def __init__(self, id_: int, kind: str, event_id: int, due: float, payload: Optional[dict] = None):
+        self.id = id_
+        self.kind = kind
+        self.event_id = event_id
+        self.due = due
+        # anything the handler needs, stored as JSON
+        self.payload = payload
+
+
+class JobScheduler:
+    """
+    Runs the jobs stored in the JOBS table of the event database when they are due.
+
+    The pending jobs are kept in a heap ordered by due time, and a single task sleeps until the earliest one. Jobs are
+    loaded with one query when the scheduler starts; jobs that came due while the bot was down run right away.
+    Each due job runs in its own task, so a long one (e.g. DMing hundreds of users) does not hold up the others.
+    A job's row is deleted once its handler has run, so a job interrupted by a shutdown runs again on the next start.
+    """
+
+    __slots__ = ('_handlers', '_jobs', '_heap', '_task', '_wakeup', '_running')
+
+    def __init__(self):
+        # {kind: async handler(job)}
+        self._handlers = {}
+        # {job_id: Job}
+        self._jobs = {}
+        # [(due, job_id)]. Rescheduled and cancelled jobs leave their old entry behind, it is skipped when it no
+        # longer matches _jobs
+        self._heap = []
+        self._task = None
+        # set when a job was added that may be due before the one the timer is sleeping for
+        self._wakeup = None
+        # tasks of the jobs being run
+        self._running = set()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def register(self, kind: str, handler: Callable[[Job], Awaitable[None]]) -> None:
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        """
+        Load the pending jobs and start the timer. Does nothing if it is already running.
+        """
+        if self._task is not None:
+            return
+
+        self._wakeup = asyncio.Event()
+        for job_id, kind, event_id, due, payload in await db.get_jobs():
+            # jobs scheduled (replace()) before the scheduler started are already in the heap
+            if job_id not in self._jobs:
+                self._push(Job(job_id, kind, event_id, due, json.loads(payload) if payload else None))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the timer and cancel the jobs being run. They keep their rows, and run again on the next start.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        running = list(self._running)
+        for task in running:
+            task.cancel()
+        # let them save their progress
+        await asyncio.gather(*running, return_exceptions=True)
+
+    async def replace(self, event_id: int, kind: str, jobs: list[tuple[float, Optional[dict]]]) -> None:
+        """
+        Replace the event's pending jobs of this kind with `jobs`, [(due, payload)], e.g. after its time changed
+        """
+        ids = await db.replace_event_jobs(event_id, kind, [(due, json.dumps(payload) if payload is not None else None)
+                                                           for due, payload in jobs])
+        for job in [job for job in self._jobs.values() if job.event_id == event_id and job.kind == kind]:
+            del self._jobs[job.id]
+        for job_id, (due, payload) in zip(ids, jobs):
+            self._push(Job(job_id, kind, event_id, due, payload))
+
+    async def save(self, job: Job) -> None:
+        """
+        Store the job's payload, e.g. a handler's progress so it can resume after a restart
+        """
+        await db.update_job_payload(job.id, json.dumps(job.payload) if job.payload is not None else None)
+
+    async def cancel_event(self, event_id: int) -> None:
+        """
+        Drop all pending jobs of the event, e.g. once it has ended
+        """
+        await db.delete_event_jobs(event_id)
+        for job in [job for job in self._jobs.values() if job.event_id == event_id]:
+            del self._jobs[job.id]
+
+    def _push(self, job: Job) -> None:
+        self._jobs[job.id] = job
+        heapq.heappush(self._heap, (job.due, job.id))
+        if self._wakeup is not None and self._heap[0][1] == job.id:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            delay = MAX_SLEEP_SECONDS
+            while self._heap:
+                due, job_id = self._heap[0]
+                job = self._jobs.get(job_id)
+                if job is None or job.due != due:
+                    heapq.heappop(self._heap)
+                    continue
+                if due > time.time():
+                    delay = min(delay, due - time.time())
+                    break
+                heapq.heappop(self._heap)
+                task = asyncio.create_task(self._execute(job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job: Job) -> None:
+        handler = self._handlers.get(job.kind)
+        try:
+            if handler is None:
+                logging.error(f'No handler for job {job.id} of kind "{job.kind}", dropping it.')
+            else:
+                await handler(job)
+        except Exception:
+            # not retried, a handler that keeps failing would otherwise run forever
+            logging.exception(f'Job {job.id} ({job.kind}) of event {job.event_id} failed.')
+
+        self._jobs.pop(job.id, None)
+        await db.delete_job(job.id)
+
+
+jobs = JobScheduler()
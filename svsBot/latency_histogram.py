@@ -0,0 +1,69 @@
+from bisect import bisect_left
+
+
+class LatencyHistogram:
+    """
+    Counts of latencies (seconds) per bucket. Bucket i holds latencies up to bounds[i]; the last bucket holds
+    everything above the largest bound.
+    """
+
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, bounds: tuple):
+        self.bounds = tuple(sorted(bounds))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        seconds = max(seconds, 0.0)
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def count_above(self, seconds: float) -> int:
+        """
+        Number of latencies above `seconds`, to bucket precision (seconds should be one of the bounds)
+        """
+        return sum(self.counts[bisect_left(self.bounds, seconds) + 1:])
+
+    def percentile(self, p: float) -> float:
+        """
+        Upper bound of the bucket that holds the p-th percentile (0-100). Returns max for the overflow bucket.
+        """
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+    def format(self) -> str:
+        """
+        One line per non-empty bucket, in ms
+        """
+        if not self.count:
+            return 'No data'
+
+        lines = []
+        lower = 0
+        for i, count in enumerate(self.counts):
+            if count:
+                if i < len(self.bounds):
+                    label = f'{lower * 1000:.0f}-{self.bounds[i] * 1000:.0f} ms'
+                else:
+                    label = f'> {lower * 1000:.0f} ms'
+                lines.append(f'{label}: {count}')
+            if i < len(self.bounds):
+                lower = self.bounds[i]
+
+        lines.append(f'Mean: {self.total / self.count * 1000:.0f} ms, '
+                     f'p99: <= {self.percentile(99) * 1000:.0f} ms, '
+                     f'max: {self.max * 1000:.0f} ms')
+        return '\n'.join(lines)
@@ -0,0 +1,65 @@
+import discord
+import time
+from typing import Iterable, Optional
+
+import logging
+
+# discord.py's limit on user_ids per guild.query_members() request
+QUERY_BATCH_SIZE = 100
+
+# users found not to be in a guild are not queried again for this many seconds
+ABSENT_TTL_SECONDS = 10 * 60
+
+# {(guild_id, discord_id): time.monotonic() at which to query them again}
+_absent = {}
+
+
+async def resolve(guild: discord.Guild, discord_ids: Iterable[int]) -> dict[int, discord.Member]:
+    """
+    The members of guild among discord_ids, {discord_id: member}. Users that are not in the guild are left out.
+
+    Members come from the guild's member cache. If the guild was not chunked (globals.CHUNK_GUILDS_AT_STARTUP), the
+    ones missing from it are fetched with guild.query_members(), QUERY_BATCH_SIZE at a time, and cached there.
+    """
+    members = {}
+    missing = []
+    now = time.monotonic()
+    for discord_id in dict.fromkeys(discord_ids):
+        member = guild.get_member(discord_id)
+        if member is not None:
+            members[discord_id] = member
+        elif not guild.chunked and _absent.get((guild.id, discord_id), 0) <= now:
+            # expired entries are deleted here, or below for users that are not looked up again
+            _absent.pop((guild.id, discord_id), None)
+            missing.append(discord_id)
+
+    for start in range(0, len(missing), QUERY_BATCH_SIZE):
+        batch = missing[start:start + QUERY_BATCH_SIZE]
+        try:
+            found = await guild.query_members(user_ids=batch, limit=len(batch), cache=True)
+        except Exception:
+            # the names are missing from this report, the next one tries again
+            logging.exception(f'Failed to fetch {len(batch)} members of guild {guild}.')
+            continue
+
+        for member in found:
+            members[member.id] = member
+        now = time.monotonic()
+        for key in [key for key, retry_at in _absent.items() if retry_at <= now]:
+            del _absent[key]
+        retry_at = now + ABSENT_TTL_SECONDS
+        for discord_id in batch:
+            if discord_id not in members:
+                _absent[guild.id, discord_id] = retry_at
+
+    if missing:
+        logging.info(f'Fetched {len(missing)} uncached members of guild {guild} in '
+                     f'{(len(missing) - 1) // QUERY_BATCH_SIZE + 1} request(s).')
+    return members
+
+
+async def get(guild: discord.Guild, discord_id: int) -> Optional[discord.Member]:
+    """
+    The member of guild with this ID, None if they are not in it. See resolve()
+    """
+    return (await resolve(guild, [discord_id])).get(discord_id)
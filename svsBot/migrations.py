@@ -0,0 +1,200 @@
+import aiosqlite
+
+import logging
+
+from . import globals
+
+# Schema migrations for each database.
+# Each migration is (version, description, statements). A database's PRAGMA user_version is the version of the last
+# migration applied to it, and migrate() applies every newer migration in order, each in its own transaction.
+# Never edit a migration that has been released; add a new one instead.
+
+USER_MIGRATIONS = [
+    (1, 'create USERS table', [
+        """CREATE TABLE IF NOT EXISTS USERS (
+                discord_ID INTEGER NOT NULL PRIMARY KEY,
+                class TEXT,
+                level INTEGER,
+                unit TEXT,
+                march_size TEXT,
+                alliance TEXT,
+                mm_traps TEXT,
+                skins TEXT,
+                status TEXT,
+                lottery INTEGER,
+                interacted_with_event INTEGER
+                );
+        """
+    ]),
+    # indexes for the queries in db.all_of_category()
+    (2, 'index USERS for status/class/lottery/interaction lookups', [
+        # category 'class' (status YES/MAYBE/NO), category 'status'
+        "CREATE INDEX IF NOT EXISTS USERS_STATUS_CLASS ON USERS (STATUS, CLASS)",
+        # category 'class' (status ALL)
+        "CREATE INDEX IF NOT EXISTS USERS_CLASS ON USERS (CLASS)",
+        # category 'lotto'
+        "CREATE INDEX IF NOT EXISTS USERS_STATUS_LOTTERY ON USERS (STATUS, LOTTERY)",
+        # category 'interacted_with_event', covers all selected columns
+        "CREATE INDEX IF NOT EXISTS USERS_INTERACTED ON USERS (INTERACTED_WITH_EVENT, STATUS, ALLIANCE)",
+    ]),
+    # integer encoding of the long-form profession columns, see ProfessionConfig.encode_profession().
+    # The long-form columns stay the source of truth; db.reencode_professions() fills these in at startup.
+    (3, 'add rank/bitmask encoded profession columns to USERS', [
+        "ALTER TABLE USERS ADD COLUMN level_rank INTEGER",
+        "ALTER TABLE USERS ADD COLUMN march_rank INTEGER",
+        "ALTER TABLE USERS ADD COLUMN unit_mask INTEGER",
+        "ALTER TABLE USERS ADD COLUMN traps_mask INTEGER",
+        "ALTER TABLE USERS ADD COLUMN skins_mask INTEGER",
+        # serves every query USERS_STATUS_CLASS did, so replace it
+        "CREATE INDEX IF NOT EXISTS USERS_STATUS_CLASS_RANKS ON USERS (STATUS, CLASS, LEVEL_RANK, MARCH_RANK)",
+        "DROP INDEX IF EXISTS USERS_STATUS_CLASS",
+    ]),
+    # when each user last changed their status, so the event roster can be rebuilt in sign-up order
+    (4, 'add status_time to USERS', [
+        "ALTER TABLE USERS ADD COLUMN status_time REAL",
+    ]),
+    # each event's sign-ups, so that several events can be active at once. A row means the user interacted with the
+    # event. USERS.STATUS, INTERACTED_WITH_EVENT and STATUS_TIME are no longer written.
+    (5, 'create ATTENDANCE table', [
+        """CREATE TABLE IF NOT EXISTS ATTENDANCE (
+                event_ID INTEGER NOT NULL,
+                discord_ID INTEGER NOT NULL,
+                status TEXT,
+                status_time REAL,
+                PRIMARY KEY (event_ID, discord_ID)
+                );
+        """,
+        # sign-ups of the event that was active during the upgrade, under event ID 0 until
+        # db.adopt_legacy_attendance() gives them its ID (which is in the event database)
+        "INSERT INTO ATTENDANCE (event_ID, discord_ID, status, status_time) "
+        "SELECT 0, discord_ID, status, status_time FROM USERS WHERE interacted_with_event = 1",
+    ]),
+    # per-event status lookups (reminders, reports) read only that event's rows. Ended events keep their rows, so
+    # nothing in USERS is rewritten when an event closes; the USERS status indexes have nothing left to serve
+    (6, 'index ATTENDANCE by event and status, drop the USERS status indexes', [
+        "CREATE INDEX IF NOT EXISTS ATTENDANCE_STATUS ON ATTENDANCE (EVENT_ID, STATUS, DISCORD_ID)",
+        "DROP INDEX IF EXISTS USERS_STATUS_CLASS_RANKS",
+        "DROP INDEX IF EXISTS USERS_STATUS_LOTTERY",
+        "DROP INDEX IF EXISTS USERS_INTERACTED",
+    ]),
+    # set by the confirm command, reset when the status changes. See globals.REMINDER_STAGES, audience 'UNCONFIRMED'
+    (7, 'add confirmed to ATTENDANCE', [
+        "ALTER TABLE ATTENDANCE ADD COLUMN confirmed INTEGER NOT NULL DEFAULT 0",
+    ]),
+]
+
+EVENT_MIGRATIONS = [
+    (1, 'create EVENT table', [
+        """CREATE TABLE IF NOT EXISTS EVENT (
+                title TEXT,
+                time TEXT,
+                message_ID INT,
+                channel_ID INT
+                );
+        """,
+        "INSERT INTO EVENT (title, time, message_ID, channel_ID) "
+        "SELECT 'placeholder', 'placeholder', 0, 0 WHERE NOT EXISTS (SELECT 1 FROM EVENT)"
+    ]),
+    # continuation messages of the event message, see RenderScheduler
+    (2, 'create EVENT_PAGES table', [
+        """CREATE TABLE IF NOT EXISTS EVENT_PAGES (
+                page INTEGER NOT NULL PRIMARY KEY,
+                message_ID INT
+                );
+        """
+    ]),
+    # one row per active event instead of the single EVENT row, pages keyed by event
+    (3, 'create EVENTS table, key EVENT_PAGES by event', [
+        """CREATE TABLE IF NOT EXISTS EVENTS (
+                message_ID INTEGER NOT NULL PRIMARY KEY,
+                channel_ID INT NOT NULL,
+                title TEXT,
+                time TEXT
+                );
+        """,
+        "INSERT INTO EVENTS (message_ID, channel_ID, title, time) "
+        "SELECT message_ID, channel_ID, title, time FROM EVENT WHERE message_ID != 0",
+        """CREATE TABLE EVENT_PAGES_NEW (
+                event_ID INTEGER NOT NULL,
+                page INTEGER NOT NULL,
+                message_ID INT,
+                PRIMARY KEY (event_ID, page)
+                );
+        """,
+        "INSERT INTO EVENT_PAGES_NEW (event_ID, page, message_ID) "
+        "SELECT EVENT.message_ID, page, EVENT_PAGES.message_ID FROM EVENT_PAGES, EVENT WHERE EVENT.message_ID != 0",
+        "DROP TABLE EVENT_PAGES",
+        "ALTER TABLE EVENT_PAGES_NEW RENAME TO EVENT_PAGES",
+        "DROP TABLE EVENT",
+    ]),
+    # events are marked as ended instead of deleted: OPEN, CLOSED (~close) or CANCELLED (~delete)
+    (4, 'add status to EVENTS', [
+        "ALTER TABLE EVENTS ADD COLUMN status TEXT NOT NULL DEFAULT 'OPEN'",
+    ]),
+    # timed work of the events (e.g. reminders), run by JobScheduler. due is unix time, payload is JSON
+    (5, 'create JOBS table', [
+        """CREATE TABLE IF NOT EXISTS JOBS (
+                job_ID INTEGER NOT NULL PRIMARY KEY,
+                kind TEXT NOT NULL,
+                event_ID INTEGER NOT NULL,
+                due REAL NOT NULL,
+                payload TEXT
+                );
+        """,
+        "CREATE INDEX IF NOT EXISTS JOBS_EVENT ON JOBS (EVENT_ID)",
+        # the "maybe" reminders of the open events were only kept in memory; time is "<t:unix time>"
+        "INSERT INTO JOBS (kind, event_ID, due) "
+        "SELECT 'maybe_reminder', message_ID, "
+        f"CAST(SUBSTR(time, 4, LENGTH(time) - 4) AS INTEGER) - {globals.CONFIRM_MAYBE_WARNING_HOURS * 60 * 60} AS due "
+        "FROM EVENTS WHERE status = 'OPEN' AND due > CAST(STRFTIME('%s', 'now') AS INTEGER)",
+    ]),
+    # reminders have stages, each with its own audience (globals.REMINDER_STAGES), under one job kind
+    (6, 'turn "maybe" reminder jobs into reminder stages', [
+        "UPDATE JOBS SET kind = 'reminder', payload = JSON_SET(COALESCE(payload, '{}'), '$.audience', 'MAYBE') "
+        "WHERE kind = 'maybe_reminder'",
+    ]),
+    # what the event message and each page show (render_scheduler.snapshot()), so that a restart can restore the
+    # events without fetching their messages
+    (7, 'store the rendered embeds of the event messages', [
+        "ALTER TABLE EVENTS ADD COLUMN shown TEXT",
+        "ALTER TABLE EVENT_PAGES ADD COLUMN shown TEXT",
+    ]),
+]
+
+
+async def get_version(conn: aiosqlite.Connection) -> int:
+    async with conn.execute("PRAGMA user_version") as cursor:
+        row = await cursor.fetchone()
+    return row[0]
+
+
+async def migrate(conn: aiosqlite.Connection, migrations: list, name: str) -> int:
+    """
+    Upgrade the database behind conn in place. Returns the resulting schema version.
+    """
+    current = await get_version(conn)
+    latest = migrations[-1][0]
+    if current > latest:
+        logging.error(f'{name} has schema version {current}, newer than this code knows about ({latest}).')
+        return current
+
+    for version, description, statements in migrations:
+        if version <= current:
+            continue
+
+        await conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                await conn.execute(statement)
+            # PRAGMA does not accept bound parameters
+            await conn.execute(f"PRAGMA user_version = {int(version)}")
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            logging.error(f'Migration {version} of {name} ({description}) failed.')
+            raise
+
+        logging.info(f'Migrated {name} to schema version {version}: {description}')
+        current = version
+
+    return current
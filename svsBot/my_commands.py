@@ -3,8 +3,9 @@ from discord.ext import commands, tasks
 
 import logging
 
-from . import db, helpers, globals
+from . import db, helpers, globals, profession_config, event_interaction, event_registry, dm_queue, render_scheduler
 from . event_interaction import EventButtonsView
+from . event_registry import events
 from . profession_interaction import ProfessionMenuView
 
 
@@ -40,26 +41,40 @@ class Event(commands.Cog):
         if globals.ADMIN_ROLE_NAME not in [r.name for r in ctx.author.roles]:
             raise commands.MissingRole(globals.ADMIN_ROLE_NAME)
 
-        # not in active event channel errors
-        if globals.eventChannel is not None:
-            # special cases for $create when there is an active event
-            if ctx.command.name == 'create':
-                if ctx.channel != globals.eventChannel:
-                    raise commands.CheckFailure(f'An event is already active in {globals.eventChannel.mention}. Only '
-                                                f'one event may be active at a time.')
-                elif ctx.channel == globals.eventChannel:
-                    raise commands.CheckFailure(f'An event is already active in this channel. {ctx.clean_prefix}delete '
-                                                f'to delete the active event.')
-            # other commands just need to be in the active event channel
-            elif ctx.channel != globals.eventChannel:
-                raise commands.CheckFailure(f'Must use command in {globals.eventChannel.mention}.')
-
-        # if there is not an active event, all commands except $create should error
-        elif globals.eventChannel is None and ctx.command.name != 'create':
-            raise commands.CheckFailure('No active event.')
+        # the events are not loaded yet, the channel could look like it has none
+        if not self.bot.initialized:
+            raise commands.CheckFailure('The bot is still starting up, try again in a moment.')
+
+        # each channel holds at most one event, and the other commands act on the channel's event
+        event = events.in_channel(ctx.channel.id)
+        if event is not None and ctx.command.name == 'create':
+            raise commands.CheckFailure(f'An event is already active in this channel. {ctx.clean_prefix}delete '
+                                        f'to delete the active event.')
+        elif event is None and ctx.command.name != 'create':
+            raise commands.CheckFailure('No active event in this channel.')
 
         return True
 
+    @staticmethod
+    def channel_event(ctx) -> event_registry.Event:
+        # cog_check made sure there is one
+        return events.in_channel(ctx.channel.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        # nickname changes. The event embed shows server display names, so only events in that guild matter
+        if before.display_name != after.display_name:
+            for event in events.in_guild(after.guild.id):
+                event.view.rename(after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User) -> None:
+        # global name changes, shown for members without a nickname
+        for event in events:
+            member = event.guild.get_member(after.id)
+            if member is not None:
+                event.view.rename(member)
+
     @commands.command(help='Creates event at time (PST, 24hr format).\n'
                            'Must be used in a valid server channel when there is not an active event.\n'
                            f'Requires role \'{globals.ADMIN_ROLE_NAME}\'.\n'
@@ -67,11 +82,12 @@ class Event(commands.Cog):
                            'If <title> or <description> are not one word, they must be enclosed in \"\"\n'
                            f'Example:   {globals.COMMAND_PREFIX}create 22/7/3 15 \"My Event\" \"This is an event\"\n'
                            f'\u200b\n'
-                           f'Note: Discord embeds are limited to 6000 characters, which puts a limit on the number of '
-                           f'people that can fit in the sign-up fields. Beyond that limit, the database will still '
-                           f'track sign-ups, but they will not be reflected in the event embed.',
+                           f'Note: Discord embeds are limited to 6000 characters. Sign-ups that do not fit in the '
+                           f'event embed are listed in additional messages below it.\n'
+                           f'\u200b\n'
+                           f'Each channel can have one active event at a time.',
                       usage='<yy/mm/dd> <hh> <\"title\"> <\"description\">')
-    @commands.max_concurrency(1)
+    @commands.max_concurrency(1, per=commands.BucketType.channel)
     async def create(self, ctx, datestring, hour: int, title, descr):
         """
         Creates event with title and description for specified date and time in PST
@@ -80,17 +96,11 @@ class Event(commands.Cog):
         """
 
         # parse event information
-        eventTimeFmt, timeUntilEvent = helpers.parse_event_input(datestring=datestring, hour=hour)
+        eventTimeFmt, _ = helpers.parse_event_input(datestring=datestring, hour=hour)
         title = helpers.parse_event_input(title=title)
         descr = helpers.parse_event_input(descr=descr)
         descr = '@ ' + eventTimeFmt + '\n\n' + descr
 
-        # TODO: make sure this actually calls confirm_maybe() only once
-        # start the background task to remind the "MAYBE's"
-        # loop will only start if timeUntilConfirmMaybe > 2 days
-        maybeLoop = await helpers.start_confirm_maybe_loop(timeUntilEvent, ctx.guild)
-        self.bot.maybe_loop = maybeLoop
-
         # get the cmdList to be put into footer
         cmdList = [ctx.clean_prefix + cmd.name for cmd in self.get_commands()]
         cmdList.append(f'{globals.COMMAND_PREFIX}help')
@@ -98,17 +108,16 @@ class Event(commands.Cog):
         embed = helpers.build_event_embed(title, descr, cmdList)
 
         eventMessage = await ctx.send(embed=embed)
-        view = EventButtonsView(eventMessage)
-        await eventMessage.edit(embed=embed, view=view)
+        event = event_registry.Event(eventMessage, title, eventTimeFmt)
+        event.view = EventButtonsView(event, embed)
+        await eventMessage.edit(embed=embed, view=event.view)
 
-        # set globals to reduce DB accessing
-        eventInfo = title + ' @ ' + eventTimeFmt
-        globals.eventInfo = eventInfo
-        globals.eventMessage = eventMessage
-        globals.eventChannel = ctx.channel
+        # keep the event in memory to reduce DB accessing, and store it in event info database
+        events.add(event)
+        await db.add_event(event.id, ctx.channel.id, title, eventTimeFmt, render_scheduler.snapshot(embed))
 
-        # store event data in event info database
-        await db.update_event(title, eventTimeFmt, eventMessage.id, ctx.channel.id)
+        # schedule the reminders, see globals.REMINDER_STAGES
+        await helpers.schedule_reminders(event, ctx.author)
 
     @commands.command(help='Edit the existing event.\n'
                            'Must be used in the same channel as an active event.\n'
@@ -122,7 +131,7 @@ class Event(commands.Cog):
                            f'\u200b\n',
                       usage='<time/title/description> <value>'
                       )
-    @commands.max_concurrency(1)
+    @commands.max_concurrency(1, per=commands.BucketType.channel)
     async def edit(self, ctx, category, *vals):
         """
         Edit the existing event
@@ -138,7 +147,9 @@ class Event(commands.Cog):
             raise commands.CheckFailure(f'Must enter a new value for event "{category}".')
 
         # get the original embed values
-        old_embed = globals.eventMessage.embeds[0]
+        event = self.channel_event(ctx)
+        renderer = event.view.renderer
+        old_embed = renderer.embed
         old_title = old_embed.title
         old_description = old_embed.description
 
@@ -151,7 +162,7 @@ class Event(commands.Cog):
                 raise commands.CheckFailure('Category "time" requires two arguments.')
 
             # get the new event time
-            eventTimeFmt, timeUntilEvent = helpers.parse_event_input(datestring=vals[0], hour=vals[1])
+            eventTimeFmt, _ = helpers.parse_event_input(datestring=vals[0], hour=vals[1])
 
             # replace the eventTimeFmt in the embed description with the new one
             temp = old_description.split('\n\n')
@@ -161,11 +172,9 @@ class Event(commands.Cog):
             # create new embed
             embed = helpers.build_event_embed(old_title, description, cmdList, old_embed)
 
-            # change the maybe_loop to new event time
-            if self.bot.maybe_loop is not None:
-                self.bot.maybe_loop.cancel()
-            maybeLoop = await helpers.start_confirm_maybe_loop(timeUntilEvent, ctx.guild)
-            self.bot.maybe_loop = maybeLoop
+            # move every reminder stage to the new event time
+            event.time = eventTimeFmt
+            await helpers.schedule_reminders(event, ctx.author)
 
         elif category == 'title':
             if len(vals) != 1:
@@ -176,6 +185,7 @@ class Event(commands.Cog):
 
             # replace the title and create new embed
             embed = helpers.build_event_embed(title, old_description, cmdList, old_embed)
+            event.title = title
 
         elif category == 'description':
             if len(vals) != 1:
@@ -196,12 +206,14 @@ class Event(commands.Cog):
             return
 
         # replace old embed with new one
-        await globals.eventMessage.edit(embed=embed)
+        renderer.set_embed(embed)
+        await renderer.flush()
+        await db.update_event(event.id, event.title, event.time)
 
     @commands.command(help='Closes event sign-ups and DMs the user a formatted CSV of attendees.\n'
                            'Must be used in the same channel as an active event.\n'
                            f'Requires role \'{globals.ADMIN_ROLE_NAME}\'.')
-    @commands.max_concurrency(1)
+    @commands.max_concurrency(1, per=commands.BucketType.channel)
     async def close(self, ctx):
         """
         Close signups and send sorted .csv of attendees to user
@@ -209,19 +221,18 @@ class Event(commands.Cog):
         Requires ADMIN role
         """
 
-        await helpers.delete_event(ctx.author, self.bot, intent='make_csv')
+        await helpers.delete_event(ctx.author, self.bot, self.channel_event(ctx), intent='make_csv')
 
-    @commands.command(help='Closes event sign-ups and resets database to prepare for new event.\n'
+    @commands.command(help='Cancels the event: closes sign-ups without sending a CSV.\n'
                            'Must be used in the same channel as an active event.\n'
                            f'Requires role \'{globals.ADMIN_ROLE_NAME}\'.')
-    @commands.max_concurrency(1)
+    @commands.max_concurrency(1, per=commands.BucketType.channel)
     async def delete(self, ctx):
         """
-        Resets event info database to default value
-        Resets everyone's status to "NO"
+        Marks the event as cancelled in the event info database
         Requires ADMIN role
         """
-        await helpers.delete_event(ctx.author, self.bot, intent='delete')
+        await helpers.delete_event(ctx.author, self.bot, self.channel_event(ctx), intent='delete')
 
 
 class DM(commands.Cog):
@@ -285,6 +296,22 @@ class DM(commands.Cog):
             await db.update_lotto(ID, lotto)
             await ctx.send(msg)
 
+    @commands.command(help='Confirms that you will attend the events you are registered as YES for.')
+    @commands.dm_only()
+    async def confirm(self, ctx) -> None:
+        """
+        Confirms the user's YES sign-ups of the active events, so that they are not reminded to confirm them.
+        Changing status afterwards takes the confirmation back.
+        """
+        ID = ctx.author.id
+        attending = [event for event in events if event.status(ID) == 'YES']
+
+        if not attending:
+            await ctx.send('You are not registered as **YES** for any event.')
+        else:
+            await db.confirm_attendance(ID, [event.id for event in attending])
+            await ctx.send('Confirmed your attendance for:\n' + '\n'.join(event.info for event in attending))
+
 
 class Misc(commands.Cog):
     def __init__(self, bot):
@@ -325,6 +352,7 @@ class Misc(commands.Cog):
 
     @commands.command(help='Sends the user a CSV of the database.\n'
                            'Must specify if you want just event attendees, or everyone in database.\n'
+                           'Statuses are those of the event in the channel the command is used in.\n'
                            f'Requires role \'{globals.ADMIN_ROLE_NAME}\'.\n'
                            '\u200b\n'
                            f'Example:   {globals.COMMAND_PREFIX}get_csv all\n',
@@ -335,21 +363,27 @@ class Misc(commands.Cog):
         if arg not in ['all', 'attending']:
             raise commands.CheckFailure('Argument must be either \'all\' or \'attending\'.')
 
+        event = events.in_channel(ctx.channel.id)
+        if arg == 'attending' and event is None:
+            raise commands.CheckFailure('No active event in this channel.')
+
         central_guild = self.bot.get_guild(globals.GUILD_ID_1508)
 
         if central_guild is None:
             raise commands.CheckFailure('Failed to acquire 1508 guild.')
 
-        csvFile = await helpers.build_csv(central_guild, status=arg.upper())
+        csvFile = await helpers.build_csv(central_guild, status=arg.upper(),
+                                          event_id=event.id if event is not None else None)
 
         if arg == 'all':
             msg = 'CSV of all users in the database'
         else:
-            msg = f'CSV of all users that responded "YES" or "MAYBE" to {globals.eventInfo}'
+            msg = f'CSV of all users that responded "YES" or "MAYBE" to {event.info}'
 
         await ctx.author.send(msg, file=csvFile)
 
     @commands.command(help='Sends the user a CSV of all users that interacted with the event.\n'
+                           'Must be used in the channel of an active event.\n'
                            f'Requires role \'{globals.ADMIN_ROLE_NAME}\'.\n')
     @commands.has_role(globals.ADMIN_ROLE_NAME)
     @commands.max_concurrency(1)
@@ -357,15 +391,16 @@ class Misc(commands.Cog):
         """
         Send the user a CSV of everyone who has interacted with the event
         """
-        if not globals.eventMessage:
-            return
+        event = events.in_channel(ctx.channel.id)
+        if event is None:
+            raise commands.CheckFailure('No active event in this channel.')
 
         central_guild = self.bot.get_guild(globals.GUILD_ID_1508)
         if central_guild is None:
             raise commands.CheckFailure('Failed to acquire 1508 guild.')
 
         msg = 'mini-CSV of all users that interacted with the event'
-        csvFile = await helpers.build_ymn_csv(central_guild)
+        csvFile = await helpers.build_ymn_csv(central_guild, event.id)
         await ctx.author.send(msg, file=csvFile)
 
     @commands.command(help='Sends the user a dump of the SQL database.\n'
@@ -380,6 +415,66 @@ class Misc(commands.Cog):
         dump = await db.dump_db(globals.USER_DATABASE_DUMP_NAME)
         await ctx.author.send(f"Dump of {globals.USER_DATABASE_NAME}", file=dump)
 
+    @commands.command(help='Sends the user runtime statistics of the bot.\n'
+                           f'Requires role \'{globals.ADMIN_ROLE_NAME}\'.')
+    @commands.has_role(globals.ADMIN_ROLE_NAME)
+    async def stats(self, ctx):
+        """
+        Sends database cache, event message, DM queue and click latency statistics to user
+        Requires ADMIN role
+        """
+        cache = db.entry_cache.stats()
+        cacheInfo = f'Entries: {cache["size"]}/{cache["max_size"]}\n' \
+                    f'Hits: {cache["hits"]}\n' \
+                    f'Misses: {cache["misses"]}\n' \
+                    f'Hit rate: {cache["hit_rate"]:.1%}'
+
+        embed = discord.Embed(title='Bot Statistics')
+        embed.add_field(name='Entry cache', value=cacheInfo, inline=False)
+
+        for event in events:
+            renderer = event.view.renderer
+            renderInfo = f'Sign-ups: {len(event.view.roster)}\n' \
+                         f'Continuation messages: {len(renderer.pages)}\n' \
+                         f'Edits: {renderer.edits}\n' \
+                         f'Skipped (unchanged): {renderer.skipped}'
+            embed.add_field(name=f'Event message: {event.title}'[:256], value=renderInfo, inline=False)
+
+        dms = dm_queue.stats()
+        dmInfo = f'Pending: {dms["pending"]}\n' \
+                 f'Sent: {dms["sent"]}\n' \
+                 f'Failed: {dms["failed"]}\n' \
+                 f'Skipped (DMs closed): {dms["skipped"]}\n' \
+                 f'Users with closed DMs: {dms["closed_dms"]}'
+        embed.add_field(name='DM queue', value=dmInfo, inline=False)
+
+        ackInfo = event_interaction.ack_latency.format()
+        if event_interaction.ack_latency.count:
+            ackInfo += f'\nOver the 3 s deadline: {event_interaction.ack_latency.count_above(3)}'
+        embed.add_field(name='Click acknowledgement latency', value=ackInfo, inline=False)
+        await ctx.author.send(embed=embed)
+
+    @commands.command(help=f'Reloads {globals.PROFESSION_INFO_JSON} without restarting the bot.\n'
+                           'New menus and CSVs use the new options immediately.\n'
+                           f'Requires role \'{globals.ADMIN_ROLE_NAME}\'.')
+    @commands.has_role(globals.ADMIN_ROLE_NAME)
+    @commands.max_concurrency(1)
+    async def reload_config(self, ctx):
+        """
+        Recompile the profession config from its json file and swap it in
+        """
+        try:
+            config = profession_config.load()
+        except Exception as e:
+            logging.exception(f'Failed to reload {globals.PROFESSION_INFO_JSON}')
+            raise commands.CheckFailure(f'Failed to reload {globals.PROFESSION_INFO_JSON}, the previous config is '
+                                        f'still active.\n{type(e).__name__}: {e}')
+
+        # options may have been added, removed or reordered
+        await db.reencode_professions()
+
+        await ctx.author.send(f'Reloaded {globals.PROFESSION_INFO_JSON}: {", ".join(config.categories)}')
+
     @commands.command(help='Purge a user from the database by discord ID.\n'
                            f'Requires role \'{globals.ADMIN_ROLE_NAME}\'.\n'
                            f'Example:   {globals.COMMAND_PREFIX}purge 164196268631916544\n',
@@ -0,0 +1,169 @@
+import discord
+import os
+from json import load as load_json
+from types import MappingProxyType
+from typing import Optional, Union
+
+import logging
+
+from . import globals
+
+
+class ProfessionCategory:
+    """
+    One category of profession_info.json (class, ce_level, units, ...), compiled for fast lookups.
+    Immutable once built.
+    """
+
+    __slots__ = ('key', 'title', 'prompt', 'options', 'descriptions', 'select_multiple',
+                 'ranks', 'long_to_short', 'select_options')
+
+    def __init__(self, key: str, dat: dict):
+        options = tuple(dat['options'])
+        descriptions = tuple(dat.get('descriptions', ()))
+
+        if descriptions:
+            select_options = tuple(discord.SelectOption(label=option, description=description)
+                                   for option, description in zip(options, descriptions))
+        else:
+            select_options = tuple(discord.SelectOption(label=option) for option in options)
+
+        set_ = super().__setattr__
+        set_('key', key)
+        set_('title', dat['category_title'])
+        set_('prompt', dat['prompt'])
+        set_('options', options)
+        set_('descriptions', descriptions)
+        set_('select_multiple', dat['select_multiple'])
+        # option -> position in the options list, replaces options.index()
+        set_('ranks', MappingProxyType({option: rank for rank, option in enumerate(options)}))
+        set_('long_to_short', MappingProxyType(dict(dat.get('convert_long_to_short', {}))))
+        set_('select_options', select_options)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def rank(self, option: Union[str, int]) -> int:
+        # the USERS.level column has INTEGER affinity, so numeric options such as "10" come back from SQLite as ints
+        rank = self.ranks.get(option)
+        if rank is None:
+            rank = self.ranks.get(str(option))
+        if rank is None:
+            # value is no longer an option (removed from the json since the user entered it). Below every option, so
+            # it sorts last in the descending sorts (level, march size); ascending sorts have to put it last themselves
+            rank = -1
+        return rank
+
+    # multi-select categories (units, mm_traps, skins) are stored in the database as bitmasks, bit n = option n
+
+    def encode_mask(self, value: str) -> int:
+        """
+        "Army, Navy" -> 0b101. Values that are not options ("None", "", removed options) have no bit.
+        """
+        mask = 0
+        if value:
+            for option in value.split(', '):
+                rank = self.ranks.get(option)
+                if rank is not None:
+                    mask |= 1 << rank
+        return mask
+
+    def decode_mask(self, mask: int) -> list[str]:
+        """
+        0b101 -> ["Army", "Navy"]
+        """
+        return [option for rank, option in enumerate(self.options) if mask >> rank & 1]
+
+
+class ProfessionConfig:
+    """
+    Every category of profession_info.json, compiled once. Immutable once built.
+    """
+
+    __slots__ = ('path', 'categories')
+
+    def __init__(self, path: str, obj: dict):
+        super().__setattr__('path', path)
+        super().__setattr__('categories', MappingProxyType({key: ProfessionCategory(key, dat)
+                                                            for key, dat in obj.items()}))
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def category(self, name: str, class_: Optional[str] = None) -> ProfessionCategory:
+        """
+        'level' resolves to 'ce_level' or 'mm_level' depending on class_
+        """
+        if name == 'level':
+            name = 'ce_level' if class_ == 'CE' else 'mm_level'
+        return self.categories[name]
+
+    def encode_profession(self, class_: str, level: Union[str, int], units: str, march_size: str,
+                          mm_traps: str, skins: str) -> tuple[int, int, int, int, int]:
+        """
+        Integer encoding of the long-form profession values, stored alongside them in USERS:
+        (LEVEL_RANK, MARCH_RANK, UNIT_MASK, TRAPS_MASK, SKINS_MASK)
+        """
+        return (
+            self.category('level', class_).rank(level),
+            self.category('march_size').rank(march_size),
+            self.category('units').encode_mask(units),
+            self.category('mm_traps').encode_mask(mm_traps),
+            self.category('skins').encode_mask(skins)
+        )
+
+
+_config = None
+# modification time of the file the active config was compiled from
+_mtime = None
+
+
+def load(path: str = globals.PROFESSION_INFO_JSON) -> ProfessionConfig:
+    """
+    Compile the profession config from the json file and make it the active config.
+
+    The new config is fully compiled before it replaces the old one, so readers see either the old or the new
+    config, never a mix. If the file is invalid, the exception propagates and the old config stays active.
+    """
+    global _config, _mtime
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, 'r') as f:
+        obj = load_json(f)
+    config = ProfessionConfig(path, obj)
+
+    _config, _mtime = config, mtime
+    logging.info(f'Loaded profession config from {path}')
+    return config
+
+
+def reload_if_changed(path: str = globals.PROFESSION_INFO_JSON) -> bool:
+    """
+    Reload the config if the json file was modified since it was last loaded. Returns True if it was reloaded.
+    """
+    global _mtime
+    try:
+        changed = os.stat(path).st_mtime_ns != _mtime
+    except OSError:
+        logging.exception(f'Could not stat {path}')
+        return False
+
+    if not changed:
+        return False
+
+    try:
+        load(path)
+    except Exception:
+        logging.exception(f'Failed to reload {path}, keeping the previous profession config')
+        # don't retry (and log) the same broken file on every poll; the next save changes the mtime again
+        _mtime = os.stat(path).st_mtime_ns
+        return False
+    return True
+
+
+def get() -> ProfessionConfig:
+    """
+    The active profession config. Loaded on first use if the bot has not loaded it yet.
+    """
+    if _config is None:
+        return load()
+    return _config
@@ -1,10 +1,9 @@
 import discord
 
 import logging
-from json import load
 
 from . import db
-from . import globals
+from . import profession_config
 
 
 class ProfessionMenu(discord.ui.Select):
@@ -231,38 +230,22 @@ class ProfessionMenu(discord.ui.Select):
             await interaction.response.edit_message(content='', embed=embed, view=None)
 
     def parse_options_from_json(self, category):
-        with open(globals.PROFESSION_INFO_JSON, 'r') as f:
-            obj = load(f)
-        if category == 'level':
-            category = 'ce_level' if self.class_ == 'CE' else 'mm_level'
-
-        dat = obj[category]
-
-        # Create the select options
-        if 'descriptions' in dat:
-            options = []
-            for option, description in zip(dat['options'], dat['descriptions']):
-                options.append(discord.SelectOption(label=option, description=description))
-        else:
-            options = [discord.SelectOption(label=option) for option in dat['options']]
+        dat = profession_config.get().category(category, self.class_)
+
+        # the select options are prebuilt; copy the list since the Select keeps a reference to it
+        options = list(dat.select_options)
         if category == 'class':
             skip_option = discord.SelectOption(label='CANCEL', description='Pick this to cancel updating info.')
             options.append(skip_option)
         self.options_ = options
 
         # set additional parameters
-        self.category_title = dat['category_title']
-        if dat['select_multiple']:
+        self.category_title = dat.title
+        if dat.select_multiple:
             self.max_vals = len(options)
 
     def get_next_category_prompt_from_json(self, next_category):
-        with open(globals.PROFESSION_INFO_JSON, 'r') as f:
-            obj = load(f)
-        if next_category == 'level':
-            next_category = 'ce_level' if self.class_ == 'CE' else 'mm_level'
-
-        dat = obj[next_category]
-        return dat['prompt']
+        return profession_config.get().category(next_category, self.class_).prompt
 
 
 class ProfessionMenuView(discord.ui.View):
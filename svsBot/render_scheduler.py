@@ -0,0 +1,164 @@
+import discord
+import asyncio
+from json import dumps
+from typing import Awaitable, Callable, Optional, Union
+
+import logging
+
+from . import db
+from . event_roster import EventRoster
+from . event_layout import layout_pages, blank_embed
+
+
+def snapshot(embed: discord.Embed) -> str:
+    """
+    The embed as stored in the event database and compared before each edit. discord.Embed.from_dict() reverses it.
+    """
+    # to_dict() shares the field list with the embed, which layout_pages() edits in place
+    return dumps(embed.to_dict(), sort_keys=True)
+
+
+class RenderScheduler:
+    """
+    Coalesces edits of the event message and its continuation messages.
+
+    Clicks mark the roster dirty instead of editing the message themselves. The messages are edited at most once
+    every `interval` seconds, with every change made since the last edit. Each message is only edited if its
+    rendered embed differs from the one it already shows.
+
+    Names that don't fit in the event embed spill over into continuation messages (pages) sent below it, see
+    event_layout.layout_pages(). Pages are created as needed and blanked, not deleted, when no longer needed.
+    Their message IDs are stored in the event database, under the event message's ID, together with what each message
+    shows (snapshot()). After a restart the scheduler picks up from there, without fetching the messages, so an event
+    message deleted meanwhile is only noticed when editing it fails; on_deleted is awaited then.
+    """
+
+    __slots__ = ('message', 'roster', 'embed', 'pages', 'interval', 'on_deleted', 'edits', 'skipped',
+                 '_dirty', '_task', '_lock', '_last_edit', '_last_sent')
+
+    def __init__(self, message: Union[discord.Message, discord.PartialMessage], embed: discord.Embed,
+                 roster: EventRoster, interval: float, pages: list[Union[discord.Message, discord.PartialMessage]] = (),
+                 shown: Optional[list[Optional[str]]] = None,
+                 on_deleted: Optional[Callable[[], Awaitable[None]]] = None):
+        self.message = message
+        self.on_deleted = on_deleted
+        self.roster = roster
+        # continuation messages, in order
+        self.pages = list(pages)
+        # the event embed the roster is rendered into, the only up-to-date copy; replace it with set_embed()
+        self.embed = embed
+        self.interval = interval
+
+        self.edits = 0
+        self.skipped = 0
+
+        self._dirty = False
+        self._task = None
+        self._lock = None
+        self._last_edit = 0.0
+        # the embed each message (event message, then pages) shows, see snapshot(). None if unknown, it is edited
+        # on the next flush. Defaults to a new event message showing `embed`
+        self._last_sent = list(shown) if shown is not None else [snapshot(embed)] + [None] * len(self.pages)
+
+    def mark_dirty(self) -> None:
+        """
+        Schedule an edit of the event message
+        """
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._render_later())
+
+    def set_embed(self, embed: discord.Embed) -> None:
+        """
+        Replace the event embed (title, description, ...). The roster is rendered into it on the next edit.
+        """
+        self.embed = embed
+        self._dirty = True
+
+    async def _render_later(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._dirty:
+            delay = self._last_edit + self.interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self.flush()
+            except Exception:
+                # still dirty, the next click or flush() retries
+                logging.exception('Failed to edit the event message.')
+                return
+
+    async def flush(self) -> None:
+        """
+        Edit the event message and pages now if anything changed since the last edit
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not self._dirty:
+                return
+            # changes made while the edit is in flight mark it dirty again
+            self._dirty = False
+
+            embeds = layout_pages(self.embed, self.roster.render_fields())
+            # pages past the end of the roster keep their place, but show nothing
+            embeds.extend(blank_embed(self.embed) for _ in range(len(embeds) - 1, len(self.pages)))
+
+            edited = 0
+            deleted = False
+            try:
+                for i, embed in enumerate(embeds):
+                    content = snapshot(embed)
+                    if i < len(self._last_sent) and content == self._last_sent[i]:
+                        continue
+
+                    if i == 0:
+                        try:
+                            await self.message.edit(embed=embed)
+                        except discord.NotFound:
+                            # nothing left to edit, or to sign up on
+                            logging.error(f'Event message {self.message.id} was deleted.')
+                            deleted = True
+                            break
+                    elif i <= len(self.pages):
+                        await self.pages[i - 1].edit(embed=embed)
+                    else:
+                        page = await self.message.channel.send(embed=embed)
+                        self.pages.append(page)
+
+                    if i < len(self._last_sent):
+                        self._last_sent[i] = content
+                    else:
+                        self._last_sent.append(content)
+                    edited += 1
+            except BaseException:
+                self._dirty = True
+                raise
+            finally:
+                if edited:
+                    self._last_edit = asyncio.get_running_loop().time()
+                    await db.save_event_render(self.message.id, self._last_sent[0],
+                                               [(page.id, shown) for page, shown in zip(self.pages, self._last_sent[1:])])
+                self.edits += edited
+
+            if deleted:
+                if self.on_deleted is not None:
+                    await self.on_deleted()
+            elif not edited:
+                self.skipped += 1
+
+    def cancel(self) -> None:
+        """
+        Drop the scheduled edit, if any
+        """
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def close(self) -> None:
+        """
+        Stop scheduling edits, then make the final one
+        """
+        self.cancel()
+        await self.flush()
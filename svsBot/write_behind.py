@@ -0,0 +1,107 @@
+import asyncio
+from typing import Union
+
+import logging
+
+from . connection_pool import ConnectionPool
+
+# writes made on every click. Only these may be queued. Each statement takes the queued values, then the key.
+WRITE_BEHIND_SQL = {
+    # (status, status_time), keyed by (event_id, discord_id)
+    'ATTENDANCE': "INSERT INTO ATTENDANCE (STATUS, STATUS_TIME, EVENT_ID, DISCORD_ID) VALUES (?, ?, ?, ?) "
+                  "ON CONFLICT (EVENT_ID, DISCORD_ID) "
+                  "DO UPDATE SET STATUS = excluded.STATUS, STATUS_TIME = excluded.STATUS_TIME, CONFIRMED = 0",
+}
+
+# a failed timed flush is retried after twice the previous delay, up to this many seconds
+MAX_RETRY_DELAY = 60.0
+
+
+class WriteBehindQueue:
+    """
+    Collects per-click updates in memory and writes them to the database in a single transaction.
+
+    Writes are keyed by a tuple of the statement's key parameters, ending with the discord ID. Only the latest values
+    per key and statement are kept. Pending writes are flushed every `interval` seconds, as soon as `max_pending` keys
+    have pending writes, and whenever flush() is called directly.
+    """
+
+    __slots__ = ('pool', 'interval', 'max_pending', '_pending', '_timer', '_flush_lock')
+
+    def __init__(self, pool: ConnectionPool, interval: float, max_pending: int):
+        self.pool = pool
+        self.interval = interval
+        self.max_pending = max_pending
+
+        # {key: {statement: values}}
+        self._pending = {}
+        self._timer = None
+        self._flush_lock = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def discard(self, discord_id: int) -> None:
+        """
+        Drop every pending write of a user
+        """
+        for key in [key for key in self._pending if key[-1] == discord_id]:
+            del self._pending[key]
+
+    async def put(self, key: tuple, statement: str, values: tuple[Union[str, int, float], ...]) -> None:
+        if statement not in WRITE_BEHIND_SQL:
+            raise ValueError(f'"{statement}" cannot be written behind.')
+
+        self._pending.setdefault(key, {})[statement] = values
+
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        delay = self.interval
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+                return
+            except Exception:
+                # the writes were put back in the queue by flush(). Retry them, as put() starts no timer while this
+                # one is still running
+                delay = min(max(delay, 1.0) * 2, MAX_RETRY_DELAY)
+                logging.exception(f'Write-behind flush failed, retrying in {delay:.0f}s.')
+
+    async def flush(self) -> None:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            # one executemany per statement, all inside one transaction
+            rows = {statement: [] for statement in WRITE_BEHIND_SQL}
+            for key, writes in pending.items():
+                for statement, values in writes.items():
+                    rows[statement].append((*values, *key))
+
+            try:
+                async with self.pool.acquire() as conn:
+                    for statement, values in rows.items():
+                        if values:
+                            await conn.executemany(WRITE_BEHIND_SQL[statement], values)
+                    await conn.commit()
+            except Exception:
+                # put the failed writes back, without overwriting anything newer that was queued in the meantime
+                for key, writes in pending.items():
+                    newer = self._pending.get(key, {})
+                    self._pending[key] = {**writes, **newer}
+                raise
+
+    async def close(self) -> None:
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        self._timer = None
+        await self.flush()
@@ -0,0 +1,144 @@
+"""
+The row order of the CSV reports (helpers.build_csv) must not change.
+
+A fixed roster is written to a fresh user database, both reports are built from it and compared to the files in
+tests/golden. After a deliberate change of the CSV, regenerate them with
+    UPDATE_GOLDEN=1 python -m pytest tests/test_csv_ordering.py
+"""
+import asyncio
+import collections
+import csv
+import io
+import os
+import random
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import ROOT
+from svsBot import db, globals, helpers, profession_config
+
+GOLDEN_DIR = os.path.join(ROOT, 'tests', 'golden')
+EVENT_ID = 1
+
+# a level, an alliance and a unit that were removed from the config after users picked them
+REMOVED_LEVEL = 'M1'
+REMOVED_ALLIANCE = '508X'
+REMOVED_UNIT = 'Marines'
+
+
+class Role:
+    def __init__(self, name):
+        self.name = name
+
+
+class Member:
+    def __init__(self, id_, display_name, roles):
+        self.id = id_
+        self.display_name = display_name
+        self.roles = roles
+
+
+class Guild:
+    # all members are cached, like a guild chunked at startup
+    chunked = True
+    id = 0
+
+    def __init__(self, members):
+        self.members = members
+
+    def get_member(self, id_):
+        return self.members.get(id_)
+
+
+def make_roster(config: profession_config.ProfessionConfig, size: int, seed: int = 508):
+    """
+    USERS rows (long form), ATTENDANCE rows of EVENT_ID and the guild's members of a random but fixed roster.
+    Few distinct values per column, so there are lots of ties for the sorts to keep in order.
+    """
+    rnd = random.Random(seed)
+    categories = config.categories
+    users, attendance, members = [], [], {}
+    for discord_id in rnd.sample(range(10 ** 17, 10 ** 18), size):
+        class_ = rnd.choice(['CE', 'MM'])
+        level = rnd.choice([*config.category('level', class_).options, REMOVED_LEVEL] if rnd.random() < .05
+                           else config.category('level', class_).options)
+        units = rnd.sample(categories['units'].options, rnd.choice([1, 1, 1, 2, 3]))
+        units = ', '.join(sorted(units, key=categories['units'].options.index))
+        if discord_id % 25 == 0:
+            units = REMOVED_UNIT
+        elif discord_id % 25 == 1:
+            units += ', ' + REMOVED_UNIT
+        march_size = rnd.choice(categories['march_size'].options)
+        alliance = REMOVED_ALLIANCE if rnd.random() < .03 else rnd.choice(categories['alliance'].options)
+        traps = ', '.join(rnd.sample(categories['mm_traps'].options[1:], rnd.randint(1, 3))) if class_ == 'MM' else ''
+        skins = ', '.join(rnd.sample(categories['skins'].options[1:], rnd.randint(1, 2))) if rnd.random() < .5 else ''
+        users.append((discord_id, class_, level, units, march_size, alliance, traps, skins, rnd.choice([0, 1])))
+
+        status = rnd.choice(['YES', 'YES', 'MAYBE', 'NO', None])
+        if status is not None:
+            attendance.append((EVENT_ID, discord_id, status, rnd.random()))
+
+        # some users left the guild or lack the CSV role, they are not in the reports
+        roll = rnd.random()
+        if roll < .95:
+            members[discord_id] = Member(discord_id, f'user{rnd.randrange(10 ** 5):05d}',
+                                         [Role(globals.CSV_ROLE_NAME)] if roll < .9 else [])
+    return users, attendance, Guild(members)
+
+
+async def build_reports(guild: Guild, users: list, attendance: list) -> dict[str, bytes]:
+    # schema only; the rows go in before the pools open, so the encoded columns are filled in like at startup
+    await db.migrate_databases()
+    with sqlite3.connect(globals.USER_DATABASE_NAME) as conn:
+        conn.executemany("INSERT INTO USERS (DISCORD_ID, CLASS, LEVEL, UNIT, MARCH_SIZE, ALLIANCE, MM_TRAPS, SKINS, "
+                         "LOTTERY) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", users)
+        conn.executemany("INSERT INTO ATTENDANCE (EVENT_ID, DISCORD_ID, STATUS, STATUS_TIME) VALUES (?, ?, ?, ?)",
+                         attendance)
+    conn.close()
+
+    await db.open_connections()
+    try:
+        reports = {}
+        for status in ['ALL', 'ATTENDING']:
+            file = await helpers.build_csv(guild, status=status, event_id=EVENT_ID)
+            reports[status] = file.fp.read()
+        return reports
+    finally:
+        await db.close_connections()
+
+
+@pytest.fixture(scope='module')
+def reports(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('csv'))
+    try:
+        shutil.copy(os.path.join(ROOT, globals.PROFESSION_INFO_JSON), globals.PROFESSION_INFO_JSON)
+        config = profession_config.load()
+        users, attendance, guild = make_roster(config, 600)
+        yield asyncio.run(build_reports(guild, users, attendance))
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.mark.parametrize('status', ['ALL', 'ATTENDING'])
+def test_csv_matches_golden(reports, status):
+    path = os.path.join(GOLDEN_DIR, f'csv_{status.lower()}.csv')
+    if os.environ.get('UPDATE_GOLDEN'):
+        with open(path, 'wb') as f:
+            f.write(reports[status])
+
+    with open(path, 'rb') as f:
+        assert reports[status] == f.read()
+
+
+def test_every_user_is_sorted(reports):
+    # each user of the full report is in one of the sorted sections, whatever their (removed) options
+    rows = list(csv.reader(io.StringIO(reports['ALL'].decode()), delimiter=',', quotechar='|'))
+    split = rows.index(['BEGIN UNSORTED'])
+
+    def names(rows_):
+        return collections.Counter(cell for row in rows_ for cell in row if cell.startswith('user'))
+
+    assert names(rows[:split]) == names(rows[split:])
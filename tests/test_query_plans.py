@@ -0,0 +1,112 @@
+"""
+The per-event queries read only that event's ATTENDANCE rows, through the indexes added by the migrations.
+
+Each query is run by the db function that issues it against a freshly migrated user database, and its EXPLAIN QUERY
+PLAN is checked for the index it should use.
+"""
+import asyncio
+import os
+import sqlite3
+
+import pytest
+
+from svsBot import db, globals
+
+EVENT_ID = 1
+
+
+class Guild:
+    chunked = True
+    id = 0
+
+    def get_member(self, id_):
+        return None
+
+
+# name -> the db call, run with the statements it executes being recorded
+CALLS = {
+    'class YES':                lambda: db.all_of_category('class', 'CE', event_id=EVENT_ID, status='YES'),
+    'class ALL':                lambda: db.all_of_category('class', 'CE', status='ALL'),
+    'lotto':                    lambda: db.all_of_category('lotto', 1, event_id=EVENT_ID, status='YES'),
+    'status':                   lambda: db.all_of_category('status', 'MAYBE', event_id=EVENT_ID),
+    'interacted':               lambda: db.all_of_category('interacted_with_event', 1, event_id=EVENT_ID),
+    'report attending':         lambda: db.get_report_entries(Guild(), EVENT_ID, statuses=['YES', 'MAYBE']),
+    'event statuses':           lambda: db.get_event_statuses(EVENT_ID),
+    'audience MAYBE':           lambda: db.get_audience_ids(EVENT_ID, 'MAYBE'),
+    'audience UNCONFIRMED':     lambda: db.get_audience_ids(EVENT_ID, 'UNCONFIRMED'),
+    'audience NOT_INTERACTED':  lambda: db.get_audience_ids(EVENT_ID, 'NOT_INTERACTED'),
+}
+
+# name -> fragments of the plan, each must be in one of its lines
+EXPECTED = {
+    'class YES':                ['SEARCH A USING COVERING INDEX ATTENDANCE_STATUS (event_ID=? AND status=?)',
+                                 'SEARCH U USING INTEGER PRIMARY KEY'],
+    'class ALL':                ['SEARCH U USING INDEX USERS_CLASS (class=?)'],
+    'lotto':                    ['SEARCH A USING COVERING INDEX ATTENDANCE_STATUS (event_ID=? AND status=?)',
+                                 'SEARCH U USING INTEGER PRIMARY KEY'],
+    'status':                   ['SEARCH A USING COVERING INDEX ATTENDANCE_STATUS (event_ID=? AND status=?)',
+                                 'SEARCH U USING INTEGER PRIMARY KEY'],
+    'interacted':               ['SEARCH A USING COVERING INDEX ATTENDANCE_STATUS (event_ID=?)',
+                                 'SEARCH U USING INTEGER PRIMARY KEY'],
+    'report attending':         ['SEARCH A USING COVERING INDEX ATTENDANCE_STATUS (event_ID=? AND status=?)',
+                                 'SEARCH U USING INTEGER PRIMARY KEY'],
+    'event statuses':           ['SEARCH ATTENDANCE USING INDEX ATTENDANCE_STATUS (event_ID=? AND status=?)'],
+    # in ID order straight from the index, so a reminder resumes without sorting
+    'audience MAYBE':           ['SEARCH ATTENDANCE USING COVERING INDEX ATTENDANCE_STATUS '
+                                 '(event_ID=? AND status=? AND discord_ID>?)'],
+    'audience UNCONFIRMED':     ['SEARCH ATTENDANCE USING INDEX ATTENDANCE_STATUS '
+                                 '(event_ID=? AND status=? AND discord_ID>?)'],
+    # walks USERS by ID, probing the event's ATTENDANCE row of each
+    'audience NOT_INTERACTED':  ['SEARCH U USING INTEGER PRIMARY KEY (rowid>?)',
+                                 'SEARCH A USING COVERING INDEX sqlite_autoindex_ATTENDANCE_1 '
+                                 '(event_ID=? AND discord_ID=?)'],
+}
+
+
+async def record_statements() -> dict[str, list[str]]:
+    """
+    name -> the statements (with their parameters filled in) that CALLS[name] executed
+    """
+    await db.open_connections()
+    try:
+        statements = []
+        for conn in db.user_db._connections:
+            await conn.set_trace_callback(statements.append)
+
+        recorded = {}
+        for name, call in CALLS.items():
+            del statements[:]
+            await call()
+            recorded[name] = [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+        return recorded
+    finally:
+        await db.close_connections()
+
+
+@pytest.fixture(scope='module')
+def plans(tmp_path_factory):
+    """
+    name -> [(statement, plan lines)] of each call in CALLS
+    """
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('plans'))
+    try:
+        recorded = asyncio.run(record_statements())
+        with sqlite3.connect(globals.USER_DATABASE_NAME) as conn:
+            plans_ = {name: [(s, [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + s)]) for s in statements]
+                      for name, statements in recorded.items()}
+        conn.close()
+        return plans_
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.mark.parametrize('name', list(CALLS))
+def test_query_plan(plans, name):
+    assert len(plans[name]) == 1, plans[name]
+    statement, plan = plans[name][0]
+    for fragment in EXPECTED[name]:
+        assert any(fragment in line for line in plan), (statement, plan)
+    # nothing reads a whole table. Scanning a subquery's result (e.g. of a window function) is fine
+    assert not any(line.startswith('SCAN') and not line.startswith('SCAN (subquery') for line in plan), \
+        (statement, plan)